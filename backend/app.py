@@ -2,8 +2,11 @@
 from fastapi import FastAPI, Depends, File, UploadFile, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, delete, func, insert, or_, select, text
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert, aggregate_order_by
 from schemas import SessionStart
 import logging
 
@@ -15,20 +18,101 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # utils
-from util import get_db, engine, upload_selfie, upload_odometer
-from util import extract_odometer_mileage
+from util import get_db, get_db_readonly, engine
+from util import upload_to_bucket, process_odometer
+from util import extract_odometer_mileage_url, OCR_EXEC
+from util import create_upload_ticket, image_ext, image_format, UPLOAD_BUCKETS, MAX_RAW_IMAGE_BYTES, MAX_UPLOAD_BYTES
+from util import upload_many, storage_http_async, MAX_UPLOAD_BATCH
+from util import SessionLocal, redis_client
+from geofence_cache import geofence_cache, geofences_within, geofences_within_many, geofence_cells, store_cell_geometries, path_length_km, EARTH_RADIUS_KM
+from location_buffer import location_buffer
+from partitions import run_maintenance as run_partition_maintenance, covered_since
 
 
 # models & schemas
+from models import utc_now
 from models import Base, Admin, Employee, UserSession, UserLocation, Geofence, GeofenceStatus, DailySummary, GeofenceAssignment
-from schemas import AdminCreate, EmployeeCreate, SessionStart, LocationUpdate, GeofenceCreate, GeofenceAssignmentCreate, EmployeeHomeUpdate
+from schemas import AdminCreate, EmployeeCreate, SessionStart, LocationUpdate, LocationBatch, GeofenceCreate, GeofenceAssignmentCreate, EmployeeHomeUpdate
+from schemas import UploadTicketRequest, OdometerOCRRequest
 
 import time
-from datetime import datetime, date ,timedelta
-import requests
-from haversine import haversine
+import asyncio
+import orjson
+from datetime import datetime, date ,timedelta, timezone
+import httpx
+from math import radians, sin, cos, asin, sqrt
 
-app = FastAPI(title="Tracking System - Day 1")
+# Redis last-seen position expiry (clients ping every 10 s)
+LAST_SEEN_TTL_S = 300
+
+# Face recognition microservice
+FACE_SERVICE_URL = "http://localhost:7000"
+
+# Creates upcoming daily user_locations partitions well before they are needed
+PARTITION_MAINTENANCE_INTERVAL_S = 6 * 60 * 60
+
+# Batched points stamped further ahead than this (device clock skew) are rejected
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+def _hav_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in km for a single pair of points."""
+    p1 = radians(lat1)
+    p2 = radians(lat2)
+    dlat = p2 - p1
+    dlng = radians(lng2) - radians(lng1)
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(sin(dlat / 2) ** 2 + cos(p1) * cos(p2) * sin(dlng / 2) ** 2))
+
+
+# --------------------------------------------------
+# HOT-PATH STATEMENTS (built once, reused from the compiled cache)
+# --------------------------------------------------
+_STMT_SESSION_BY_ID = select(UserSession).where(UserSession.id == bindparam("sid"))
+
+_STMT_LAST_POINT_TS = (
+    select(UserLocation.timestamp)
+    .where(UserLocation.session_id == bindparam("sid"))
+    .order_by(UserLocation.timestamp.desc())
+    .limit(1)
+)
+
+_STMT_LAST_POINT = (
+    select(UserLocation.lat, UserLocation.lng, UserLocation.timestamp)
+    .where(UserLocation.session_id == bindparam("sid"))
+    .order_by(UserLocation.timestamp.desc())
+    .limit(1)
+)
+
+_STMT_POLYLINE = (
+    select(UserLocation.lat, UserLocation.lng, UserLocation.timestamp)
+    .where(UserLocation.session_id == bindparam("sid"))
+    .order_by(UserLocation.timestamp.asc())
+)
+
+_STMT_ENCODED_POLYLINE = (
+    select(func.ST_AsEncodedPolyline(
+        func.ST_MakeLine(aggregate_order_by(UserLocation.geom, UserLocation.timestamp.asc()))
+    ))
+    .where(UserLocation.session_id == bindparam("sid"))
+)
+
+# Mapbox vector tile of geofence H3 cells; hexagons come from h3_cells (GiST indexed)
+_STMT_GEOFENCE_CELL_TILE = text("""
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS merc, ST_Transform(ST_TileEnvelope(:z, :x, :y), 4326) AS wgs
+    ),
+    mvt AS (
+        SELECT g.id AS geofence_id, g.name, c.h3::text AS h3,
+               ST_AsMVTGeom(ST_Transform(c.geom, 3857), bounds.merc) AS geom
+        FROM bounds
+        JOIN h3_cells c ON c.geom && bounds.wgs
+        JOIN geofences g ON g.cells @> ARRAY[c.h3]
+    )
+    SELECT ST_AsMVT(mvt, 'geofence_cells', 4096, 'geom') FROM mvt
+""")
+
+
+app = FastAPI(title="Tracking System - Day 1", default_response_class=ORJSONResponse)
 
 # --------------------------------------------------
 # VALIDATION ERROR HANDLER
@@ -61,11 +145,91 @@ app.add_middleware(
 @app.on_event("startup")
 def startup():
     try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
         Base.metadata.create_all(bind=engine, checkfirst=True)
-        logger.info("✔ Tables checked — existing tables were NOT modified.")
+        logger.info("✔ Tables checked — existing tables were NOT modified (run migrate.py for column upgrades).")
     except Exception as e:
         logger.error(f"❌ Error checking/creating tables: {str(e)}")
 
+    try:
+        result = run_partition_maintenance(engine)
+        if result is not None:
+            logger.info(f"✔ user_locations partitions checked: {result}")
+    except Exception as e:
+        logger.error(f"❌ Error maintaining user_locations partitions: {str(e)}")
+
+    db = SessionLocal()
+    try:
+        geofence_cache.refresh(db)
+        logger.info(f"✔ Geofence cache loaded ({len(geofence_cache)} geofences, gen {geofence_cache.generation})")
+    except Exception as e:
+        logger.error(f"❌ Error loading geofence cache: {str(e)}")
+    finally:
+        db.close()
+
+
+# ---------------------------------------------
+# USER_LOCATIONS PARTITION MAINTENANCE (every 6 hours)
+# ---------------------------------------------
+async def _partition_maintenance_loop():
+    while True:
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL_S)
+        try:
+            await run_in_threadpool(run_partition_maintenance, engine)
+        except Exception as e:
+            logger.error(f"❌ Error maintaining user_locations partitions: {str(e)}")
+
+
+@app.on_event("startup")
+async def start_partition_maintenance():
+    app.state.partition_task = asyncio.create_task(_partition_maintenance_loop())
+
+
+@app.on_event("shutdown")
+async def stop_partition_maintenance():
+    app.state.partition_task.cancel()
+
+
+# ---------------------------------------------
+# FACE SERVICE CLIENT (pooled, keep-alive)
+# ---------------------------------------------
+@app.on_event("startup")
+async def open_face_client():
+    app.state.face_client = httpx.AsyncClient(
+        base_url=FACE_SERVICE_URL,
+        timeout=20.0,
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+
+
+@app.on_event("shutdown")
+async def close_face_client():
+    await app.state.face_client.aclose()
+
+
+@app.on_event("shutdown")
+async def close_storage_client():
+    await storage_http_async.aclose()
+
+
+# ---------------------------------------------
+# POLYLINE WRITE BUFFER (batched inserts)
+# ---------------------------------------------
+@app.on_event("startup")
+async def start_location_buffer():
+    location_buffer.start()
+
+
+@app.on_event("shutdown")
+async def stop_location_buffer():
+    await location_buffer.stop()
+
+
+@app.on_event("shutdown")
+def stop_ocr_executor():
+    OCR_EXEC.shutdown(wait=False, cancel_futures=True)
+
 # ---------------------------------------------
 # ADMIN CREATE
 # ---------------------------------------------
@@ -74,7 +238,6 @@ def create_admin(data: AdminCreate, db: Session = Depends(get_db)):
     admin = Admin(name=data.name, email=data.email, password_hash="default_admin_password_hash")
     db.add(admin)
     db.commit()
-    db.refresh(admin)
     return {"message": "Admin created", "admin_id": admin.id}
 
 # ---------------------------------------------
@@ -85,7 +248,6 @@ def create_employee(data: EmployeeCreate, db: Session = Depends(get_db)):
     emp = Employee(name=data.name, employee_code=data.employee_code)
     db.add(emp)
     db.commit()
-    db.refresh(emp)
     return {"message": "Employee created", "employee_id": emp.id}
 
 
@@ -93,8 +255,13 @@ def create_employee(data: EmployeeCreate, db: Session = Depends(get_db)):
 # EMPLOYEE LIST (ADMIN)
 # ---------------------------------------------
 @app.get("/admin/employees")
-def list_employees(db: Session = Depends(get_db)):
-    employees = db.query(Employee).order_by(Employee.created_at.desc()).all()
+async def list_employees(db: Session = Depends(get_db_readonly)):
+    employees = await run_in_threadpool(
+        lambda: db.execute(
+            select(Employee.id, Employee.name, Employee.employee_code, Employee.is_active, Employee.created_at)
+            .order_by(Employee.created_at.desc())
+        ).all()
+    )
     return [
         {
             "id": e.id,
@@ -115,31 +282,93 @@ def root():
     return {"message": "Tracking backend running (Day 1 complete)"}
 
 
+# ----------------------------------------------------------
+# DIRECT UPLOAD TICKET (client PUTs the image straight to Supabase)
+# ----------------------------------------------------------
+@app.post("/upload/ticket")
+async def upload_ticket(data: UploadTicketRequest):
+    if data.bucket not in UPLOAD_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Unknown bucket: {data.bucket}")
+    if image_ext(data.filename) is None:
+        raise HTTPException(status_code=400, detail="Only .jpg, .jpeg, .png and .webp images are accepted")
+
+    ticket = await run_in_threadpool(create_upload_ticket, data.filename, data.bucket)
+    if not ticket:
+        raise HTTPException(status_code=502, detail="Could not create upload URL")
+    return ticket
+
+
+# ----------------------------------------------------------
+# IMAGE UPLOAD VALIDATION (before anything is read or stored)
+# ----------------------------------------------------------
+async def _require_image(file: UploadFile, label: str, max_bytes: int = MAX_RAW_IMAGE_BYTES):
+    # Size first (from the multipart parser), so oversized files are never decoded.
+    # Default is the raw phone photo limit for images that get downscaled before storage
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"{label} image larger than {max_bytes >> 20} MB")
+    # Anything Pillow can open (JPEG, PNG, WEBP, HEIC, ...) is accepted
+    if await run_in_threadpool(image_format, file.file) is None:
+        raise HTTPException(status_code=400, detail=f"{label} must be an image")
+
+
+# ----------------------------------------------------------
+# BATCH IMAGE UPLOAD (one request, parallel uploads)
+# ----------------------------------------------------------
+@app.post("/upload/{bucket}/batch")
+async def upload_batch(bucket: str, files: list[UploadFile] = File(...)):
+    if bucket not in UPLOAD_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Unknown bucket: {bucket}")
+    if len(files) > MAX_UPLOAD_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_UPLOAD_BATCH} files per batch")
+    for f in files:
+        await _require_image(f, f.filename or "File")
+
+    urls = await upload_many(files, bucket)
+    return [{"filename": f.filename, "url": url} for f, url in zip(files, urls)]
+
+
+# ----------------------------------------------------------
+# ODOMETER OCR FOR AN ALREADY-UPLOADED IMAGE
+# ----------------------------------------------------------
+@app.post("/upload/odometer/ocr")
+async def odometer_ocr(data: OdometerOCRRequest):
+    mileage = await extract_odometer_mileage_url(data.url)
+    return {"url": data.url, "mileage": mileage}
+
+
 # ----------------------------------------------------------
 # EMPLOYEE CHECK-IN (START SESSION)
 # ----------------------------------------------------------
 @app.post("/session/start")
-def start_session(
+async def start_session(
     data: str = Form(...),  # Receive as string
     selfie: UploadFile = File(...),
     odometer: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
     try:
+        # The selfie is stored as-is for face checks, so it must fit the storage limit raw
+        await _require_image(selfie, "Selfie", MAX_UPLOAD_BYTES)
+        await _require_image(odometer, "Odometer")
+
         logger.info(f"Starting session - parsing data...")
         # Parse the JSON string
         import json
         session_data = json.loads(data)
         parsed_data = SessionStart(**session_data)
         logger.info(f"Parsed session data: employee_id={parsed_data.employee_id}, employee_code={parsed_data.employee_code}")
-        
+
         # Find employee by ID or code
         employee = None
         if parsed_data.employee_id:
-            employee = db.query(Employee).filter(Employee.id == parsed_data.employee_id).first()
+            employee = await run_in_threadpool(
+                lambda: db.query(Employee).filter(Employee.id == parsed_data.employee_id).first()
+            )
             logger.info(f"Looking up employee by ID: {parsed_data.employee_id}")
         elif parsed_data.employee_code:
-            employee = db.query(Employee).filter(Employee.employee_code == parsed_data.employee_code).first()
+            employee = await run_in_threadpool(
+                lambda: db.query(Employee).filter(Employee.employee_code == parsed_data.employee_code).first()
+            )
             logger.info(f"Looking up employee by code: {parsed_data.employee_code}")
         
         if not employee:
@@ -152,7 +381,7 @@ def start_session(
         # Enforce HOME check-in (must be within home_radius_m)
         # --------------------------------------------------
         if employee.home_lat is not None and employee.home_lng is not None and employee.home_radius_m is not None:
-            distance_km = haversine((employee.home_lat, employee.home_lng), (parsed_data.lat, parsed_data.lng))
+            distance_km = _hav_km(employee.home_lat, employee.home_lng, parsed_data.lat, parsed_data.lng)
             if distance_km > (employee.home_radius_m / 1000.0):
                 logger.error(
                     f"Check-in denied: outside home radius. distance_km={distance_km:.4f}, allowed_km={employee.home_radius_m/1000.0:.4f}"
@@ -162,39 +391,44 @@ def start_session(
             logger.warning("Employee home location not set; skipping home radius check")
 
         # --------------------------------------------------
-        # Face verification via microservice (port 7000)
+        # Face verification (port 7000) + selfie upload, concurrently with odometer upload + OCR
         # --------------------------------------------------
-        try:
-            # Use sync file read (we are in a sync def)
-            files = {"file": (selfie.filename or "selfie.jpg", selfie.file.read(), selfie.content_type or "image/jpeg")}
-            face_resp = requests.post("http://localhost:7000/face/verify", files=files, timeout=20)
+        # The selfie is never read into memory: it is streamed from the spooled
+        # upload to the face service, then (only if it matches) rewound and
+        # streamed to storage; process_odometer handles the odometer photo
+        selfie_name = selfie.filename or "selfie.jpg"
+        selfie_type = selfie.content_type or "image/jpeg"
+
+        async def verify_and_store_selfie():
+            files = {"file": (selfie_name, selfie.file, selfie_type)}
+            face_resp = await app.state.face_client.post("/face/verify", files=files)
             face_resp.raise_for_status()
             face_json = face_resp.json()
-            logger.info(f"Face verify response: {face_json}")
-            if not face_json.get("match"):
-                raise HTTPException(status_code=401, detail="Face not recognized")
-            verified_id = face_json.get("employee_id")
-            if verified_id != employee.id:
-                raise HTTPException(status_code=401, detail="Face does not match employee")
-        except HTTPException:
-            raise
-        except Exception as exc:
-            logger.error(f"Face verification failed: {exc}")
+            if not face_json.get("match") or face_json.get("employee_id") != employee.id:
+                return face_json, None
+            return face_json, await upload_to_bucket(selfie, "selfies")
+
+        logger.info("Verifying face, uploading images and reading odometer...")
+        selfie_result, odo_result = await asyncio.gather(
+            verify_and_store_selfie(),
+            process_odometer(odometer),
+            return_exceptions=True,
+        )
+
+        if isinstance(selfie_result, Exception):
+            logger.error(f"Face verification failed: {selfie_result}")
             raise HTTPException(status_code=502, detail="Face verification service error")
-        
-        # Upload images to the correct Supabase buckets
-        logger.info(f"Uploading selfie and odometer images...")
-        # Rewind file if needed after verify
-        try:
-            selfie.file.seek(0)
-        except Exception:
-            pass
-        selfie_url = upload_selfie(selfie)
-        odo_url = upload_odometer(odometer)
+        face_json, selfie_url = selfie_result
+        logger.info(f"Face verify response: {face_json}")
+        if not face_json.get("match"):
+            raise HTTPException(status_code=401, detail="Face not recognized")
+        verified_id = face_json.get("employee_id")
+        if verified_id != employee.id:
+            raise HTTPException(status_code=401, detail="Face does not match employee")
+
+        # Upload/OCR helpers report failure as None / 0.0 rather than raising
+        odo_url, odo_value = (None, 0.0) if isinstance(odo_result, Exception) else odo_result
         logger.info(f"Images uploaded - selfie_url: {selfie_url}, odo_url: {odo_url}")
-
-        # Placeholder odometer reading (extract later)
-        odo_value = extract_odometer_mileage(odometer)
         logger.info(f"Odometer value extracted: {odo_value}")
 
         # Create session
@@ -208,8 +442,7 @@ def start_session(
         )
 
         db.add(session)
-        db.commit()
-        db.refresh(session)
+        await run_in_threadpool(db.commit)
         logger.info(f"✅ Session created successfully - Session ID: {session.id}")
         logger.info(f"Session details: employee_id={session.employee_id}, lat={session.start_lat}, lng={session.start_lng}")
 
@@ -225,7 +458,7 @@ def start_session(
         raise
     except Exception as e:
         logger.error(f"❌ Error in start_session: {str(e)}", exc_info=True)
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         raise HTTPException(status_code=400, detail=str(e))
 
 
@@ -248,22 +481,23 @@ def set_employee_home(employee_id: int, data: EmployeeHomeUpdate, db: Session =
 # ADMIN: ENROLL EMPLOYEE FACE (proxy to face service)
 # ----------------------------------------------------------
 @app.post("/admin/employee/{employee_id}/enroll-face")
-def enroll_employee_face_route(
+async def enroll_employee_face_route(
     employee_id: int,
     file: UploadFile | None = File(None),
     image_url: str | None = Form(None),
     db: Session = Depends(get_db)
 ):
-    emp = db.query(Employee).filter(Employee.id == employee_id).first()
+    emp = await run_in_threadpool(lambda: db.query(Employee).filter(Employee.id == employee_id).first())
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
+    face_client = app.state.face_client
     try:
         if image_url:
             data = {"image_url": image_url}
-            resp = requests.post(f"http://localhost:7000/face/enroll/{employee_id}", data=data, timeout=180)
+            resp = await face_client.post(f"/face/enroll/{employee_id}", data=data, timeout=180)
         elif file is not None:
-            files = {"file": (file.filename or "face.jpg", file.file.read(), file.content_type or "image/jpeg")}
-            resp = requests.post(f"http://localhost:7000/face/enroll/{employee_id}", files=files, timeout=180)
+            files = {"file": (file.filename or "face.jpg", file.file, file.content_type or "image/jpeg")}
+            resp = await face_client.post(f"/face/enroll/{employee_id}", files=files, timeout=180)
         else:
             raise HTTPException(status_code=400, detail="Provide file or image_url")
         resp.raise_for_status()
@@ -279,30 +513,33 @@ def enroll_employee_face_route(
 # ADMIN: DELETE EMPLOYEE (and face)
 # ----------------------------------------------------------
 @app.delete("/admin/employee/{employee_id}")
-def delete_employee(employee_id: int, db: Session = Depends(get_db)):
-    emp = db.query(Employee).filter(Employee.id == employee_id).first()
+async def delete_employee(employee_id: int, db: Session = Depends(get_db)):
+    emp = await run_in_threadpool(lambda: db.query(Employee).filter(Employee.id == employee_id).first())
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
 
     # call face service delete (best effort)
     try:
-        requests.delete(f"http://localhost:7000/face/delete/{employee_id}", timeout=20)
+        await app.state.face_client.delete(f"/face/delete/{employee_id}")
     except Exception as exc:
         logger.warning(f"Face delete warning: {exc}")
 
-    # Also remove local EmployeeFace if exists
-    try:
-        from models import EmployeeFace
-        face = db.query(EmployeeFace).filter(EmployeeFace.employee_id == employee_id).first()
-        if face:
-            db.delete(face)
-            db.commit()
-    except Exception as exc:
-        logger.warning(f"Local face row delete warning: {exc}")
+    def delete_rows():
+        # Also remove local EmployeeFace if exists
+        try:
+            from models import EmployeeFace
+            face = db.query(EmployeeFace).filter(EmployeeFace.employee_id == employee_id).first()
+            if face:
+                db.delete(face)
+                db.commit()
+        except Exception as exc:
+            logger.warning(f"Local face row delete warning: {exc}")
 
-    # Finally delete employee
-    db.delete(emp)
-    db.commit()
+        # Finally delete employee
+        db.delete(emp)
+        db.commit()
+
+    await run_in_threadpool(delete_rows)
     return {"message": "Employee deleted", "employee_id": employee_id}
 
 
@@ -311,162 +548,336 @@ def delete_employee(employee_id: int, db: Session = Depends(get_db)):
 # LOCATION UPDATE LOGGING(10 sec - FOR DISTANCE /60 sec - SQL) - FOR POLYLINE  
 # ----------------------------------------------------------
 @app.post("/tracking/update-location")
-def update_location(
+async def update_location(
     data: LocationUpdate,
     db: Session = Depends(get_db)
 ):
     try:
-        logger.info(f"Location update received - session_id: {data.session_id}, lat: {data.lat}, lng: {data.lng}")
+        logger.debug("Location update received - session_id: %s, lat: %s, lng: %s", data.session_id, data.lat, data.lng)
         
         # --------------------------------------------------
         # 1️⃣ Validate session
         # --------------------------------------------------
-        session = (
-            db.query(UserSession)
-            .filter(UserSession.id == data.session_id)
-            .first()
+        session = await run_in_threadpool(
+            lambda: db.execute(_STMT_SESSION_BY_ID, {"sid": data.session_id}).scalar_one_or_none()
         )
         if not session:
-            logger.error(f"Invalid session ID: {data.session_id}")
+            logger.error("Invalid session ID: %s", data.session_id)
             raise HTTPException(status_code=404, detail="Session not found")
 
-        logger.info(f"Session validated - employee_id: {session.employee_id}")
+        employee_id = session.employee_id
+        logger.debug("Session validated - employee_id: %s", employee_id)
 
         # --------------------------------------------------
         # 2️⃣ Update last known position (for reports)
         # --------------------------------------------------
         session.end_lat = data.lat # type: ignore
         session.end_lng = data.lng # type: ignore
-        db.commit()
-        logger.debug(f"Session position updated: {data.lat}, {data.lng}")
+        await run_in_threadpool(db.commit)
+        logger.debug("Session position updated: %s, %s", data.lat, data.lng)
 
         # --------------------------------------------------
         # 3️⃣ POLYLINE LOGGING (EVERY 60 SECONDS)
         # --------------------------------------------------
-        last_point = (
-            db.query(UserLocation)
-            .filter(UserLocation.session_id == data.session_id)
-            .order_by(UserLocation.timestamp.desc())
-            .first()
-        )
+        # One clock read per ping; columns are naive TIMESTAMP holding UTC
+        now = datetime.now(timezone.utc)
+        now_ts = now.timestamp()
+        current_time = now.replace(tzinfo=None)
+
+        # Last polyline write time: Redis throttle cache first, DB on miss
+        poly_key = f"sess:{data.session_id}:lpoly"
+        last_ts = None
+        refresh_cache = False
+        if redis_client is not None:
+            try:
+                cached = await redis_client.get(poly_key)
+                last_ts = float(cached) if cached is not None else None
+            except Exception as exc:
+                logger.warning("Redis get failed, using DB: %s", exc)
+
+        if last_ts is None:
+            last_point_ts = await run_in_threadpool(
+                lambda: db.execute(_STMT_LAST_POINT_TS, {"sid": data.session_id}).scalar()
+            )
+            if last_point_ts:
+                last_ts = last_point_ts.replace(tzinfo=timezone.utc).timestamp()
+                refresh_cache = True
 
-        current_time = datetime.utcnow()
-        should_log_polyline = (
-            not last_point or
-            (current_time - last_point.timestamp).total_seconds() >= 60
-        )
+        should_log_polyline = last_ts is None or (now_ts - last_ts) >= 60
 
+        # Queued only: location_buffer writes it with the next batch, so it isn't durable yet
+        polyline_queued = False
         if should_log_polyline:
-            logger.info(f"Logging polyline point for session {data.session_id}")
-            user_loc = UserLocation(
-                session_id=data.session_id,
-                employee_id=session.employee_id,
-                lat=data.lat,
-                lng=data.lng,
-                timestamp=current_time
-            )
-            db.add(user_loc)
-            db.commit()
-            logger.debug(f"Polyline point logged")
+            logger.debug("Queueing polyline point for session %s", data.session_id)
+            polyline_queued = location_buffer.put({
+                "session_id": data.session_id,
+                "employee_id": employee_id,
+                "lat": data.lat,
+                "lng": data.lng,
+                "timestamp": current_time,
+            })
+            if polyline_queued:
+                # A shed point (buffer full) is retried on the next ping
+                last_ts = now_ts
+                refresh_cache = True
+
+        if redis_client is not None and refresh_cache:
+            try:
+                await redis_client.setex(poly_key, 120, last_ts)
+            except Exception as exc:
+                logger.warning("Redis setex failed: %s", exc)
+
+        # Last-seen position for /admin/live-location, fresher than the batched polyline
+        if redis_client is not None:
+            try:
+                await redis_client.setex(
+                    f"sess:{data.session_id}:last",
+                    LAST_SEEN_TTL_S,
+                    orjson.dumps({"lat": data.lat, "lng": data.lng, "timestamp": current_time}),
+                )
+            except Exception as exc:
+                logger.warning("Redis last-seen update failed: %s", exc)
 
         # --------------------------------------------------
         # 4️⃣ GEOFENCE CHECK (EVERY 10 SECONDS)
         # --------------------------------------------------
-        geofences = db.query(Geofence).all()
-        logger.debug(f"Checking {len(geofences)} geofences")
+        if geofence_cache.is_stale():
+            try:
+                await run_in_threadpool(geofence_cache.refresh_if_stale, db)
+            except Exception as exc:
+                logger.warning("Geofence cache refresh failed: %s", exc)
+        if geofence_cache.loaded:
+            hits = geofence_cache.containing(data.lat, data.lng)
+        else:
+            # Startup load failed: fall back to the GIN cell lookup + ST_DWithin query
+            hits = await run_in_threadpool(geofences_within, db, data.lat, data.lng)
+        logger.debug("Point inside %d of %d geofences", len(hits), len(geofence_cache))
 
         geofence_count = 0
-        for gf in geofences:
-            dist_km = haversine(
-                (gf.center_lat, gf.center_lng),
-                (data.lat, data.lng)
+        if hits:
+            if logger.isEnabledFor(logging.DEBUG):
+                for gf_id, gf_name in hits:
+                    logger.debug("Employee inside geofence: %s (ID: %s)", gf_name, gf_id)
+
+            # Mark completion atomically: rows already present for this session are
+            # skipped by the unique (session_id, geofence_id) constraint
+            stmt = (
+                pg_insert(GeofenceStatus)
+                .values([
+                    {
+                        "geofence_id": gf_id,
+                        "session_id": data.session_id,
+                        "employee_id": employee_id,
+                        "completed": True,
+                        "completed_at": current_time,
+                    }
+                    for gf_id, _ in hits
+                ])
+                .on_conflict_do_nothing(index_elements=["session_id", "geofence_id"])
+                .returning(GeofenceStatus.geofence_id)
             )
 
-            logger.debug(f"Geofence {gf.id} ({gf.name}): distance = {dist_km:.4f} km, radius = {gf.radius_m/1000:.4f} km")
-
-            # Check if employee is within geofence
-            if dist_km <= (gf.radius_m / 1000.0):
-                logger.info(f"Employee inside geofence: {gf.name} (ID: {gf.id})")
-                
-                # Check if this geofence was already completed in this session
-                already_done = (
-                    db.query(GeofenceStatus)
-                    .filter(
-                        GeofenceStatus.geofence_id == gf.id,
-                        GeofenceStatus.session_id == data.session_id
-                    )
-                    .first()
-                )
-
-                # Mark geofence as completed if not already done
-                if not already_done:
-                    logger.info(f"Marking geofence {gf.id} as completed for session {data.session_id}")
-                    
-                    # Log entry point
-                    entry_point = UserLocation(
+            def mark_completed():
+                new_ids = db.execute(stmt).scalars().all()
+                # Entry point for each newly completed geofence
+                db.add_all([
+                    UserLocation(
                         session_id=data.session_id,
-                        employee_id=session.employee_id,
+                        employee_id=employee_id,
                         lat=data.lat,
                         lng=data.lng,
                         timestamp=current_time
                     )
-                    db.add(entry_point)
-
-                    # Create geofence status
-                    status = GeofenceStatus(
-                        geofence_id=gf.id,
-                        session_id=data.session_id,
-                        employee_id=session.employee_id,
-                        completed=True,
-                        completed_at=current_time
-                    )
-                    db.add(status)
-                    db.commit()
-                    geofence_count += 1
-                    logger.info(f"Geofence {gf.id} completed and recorded")
-                else:
-                    logger.debug(f"Geofence {gf.id} already completed in this session")
-
-        logger.info(f"Location update processed - polyline_logged: {should_log_polyline}, geofences_completed: {geofence_count}")
+                    for _ in new_ids
+                ])
+                db.commit()
+                return new_ids
+
+            new_ids = await run_in_threadpool(mark_completed)
+            geofence_count = len(new_ids)
+            if new_ids:
+                logger.info("Geofences %s completed and recorded for session %s", new_ids, data.session_id)
+
+        logger.debug(
+            "Location update processed - polyline_queued: %s, geofences_completed: %d",
+            polyline_queued, geofence_count,
+        )
 
         return {
             "message": "Location processed",
             "session_id": data.session_id,
             "lat": data.lat,
             "lng": data.lng,
-            "polyline_logged": should_log_polyline,
+            "polyline_queued": polyline_queued,
             "geofences_completed": geofence_count
         }
     
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in update_location: {str(e)}", exc_info=True)
+        logger.error("Error in update_location: %s", e, exc_info=True)
         raise HTTPException(status_code=400, detail=str(e))
 
 
 
+# ----------------------------------------------------------
+# BATCHED LOCATION UPDATES (client buffers 30-60 s of points)
+# ----------------------------------------------------------
+@app.post("/tracking/update-locations")
+async def update_locations(
+    batch: LocationBatch,
+    db: Session = Depends(get_db)
+):
+    try:
+        session = await run_in_threadpool(
+            lambda: db.execute(_STMT_SESSION_BY_ID, {"sid": batch.session_id}).scalar_one_or_none()
+        )
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        employee_id = session.employee_id
+
+        # Columns are naive TIMESTAMP holding UTC; only keep points that have a
+        # user_locations partition (yesterday onwards) and aren't from the future
+        earliest = covered_since()
+        latest = utc_now() + MAX_CLOCK_SKEW
+        points = sorted(
+            (
+                p for p in (
+                    (lat, lng, ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts)
+                    for lat, lng, ts in batch.points
+                )
+                if earliest <= p[2] <= latest
+            ),
+            key=lambda p: p[2],
+        )
+        rejected = len(batch.points) - len(points)
+        if rejected:
+            logger.warning("Rejected %d batched points outside %s..%s for session %s", rejected, earliest, latest, batch.session_id)
+        if not points:
+            raise HTTPException(status_code=400, detail="No points within the accepted time range")
+        last_lat, last_lng, last_time = points[-1]
+
+        # First time each geofence was entered within this batch
+        if geofence_cache.is_stale():
+            try:
+                await run_in_threadpool(geofence_cache.refresh_if_stale, db)
+            except Exception as exc:
+                logger.warning("Geofence cache refresh failed: %s", exc)
+        entered = {}
+        if geofence_cache.loaded:
+            for lat, lng, ts in points:
+                for gf_id, _ in geofence_cache.containing(lat, lng):
+                    entered.setdefault(gf_id, ts)
+        else:
+            # Cache still not loaded: one set-based query for the whole batch, not one per point
+            for i, gf_id in await run_in_threadpool(geofences_within_many, db, points):
+                entered.setdefault(gf_id, points[i][2])
+
+        def write_batch():
+            # Telemetry: skip the WAL flush wait for this transaction only
+            db.execute(text("SET LOCAL synchronous_commit = off"))
+            db.execute(
+                insert(UserLocation),
+                [
+                    {
+                        "session_id": batch.session_id,
+                        "employee_id": employee_id,
+                        "lat": lat,
+                        "lng": lng,
+                        "timestamp": ts,
+                    }
+                    for lat, lng, ts in points
+                ],
+            )
+            session.end_lat = last_lat # type: ignore
+            session.end_lng = last_lng # type: ignore
+
+            new_ids = []
+            if entered:
+                new_ids = db.execute(
+                    pg_insert(GeofenceStatus)
+                    .values([
+                        {
+                            "geofence_id": gf_id,
+                            "session_id": batch.session_id,
+                            "employee_id": employee_id,
+                            "completed": True,
+                            "completed_at": ts,
+                        }
+                        for gf_id, ts in entered.items()
+                    ])
+                    .on_conflict_do_nothing(index_elements=["session_id", "geofence_id"])
+                    .returning(GeofenceStatus.geofence_id)
+                ).scalars().all()
+
+            # Points, last position and completions in one commit
+            db.commit()
+            return new_ids
+
+        new_ids = await run_in_threadpool(write_batch)
+        if new_ids:
+            logger.info("Geofences %s completed and recorded for session %s", new_ids, batch.session_id)
+
+        if redis_client is not None:
+            last_ts = last_time.replace(tzinfo=timezone.utc).timestamp()
+            try:
+                await redis_client.setex(f"sess:{batch.session_id}:lpoly", 120, last_ts)
+                await redis_client.setex(
+                    f"sess:{batch.session_id}:last",
+                    LAST_SEEN_TTL_S,
+                    orjson.dumps({"lat": last_lat, "lng": last_lng, "timestamp": last_time}),
+                )
+            except Exception as exc:
+                logger.warning("Redis update after batch failed: %s", exc)
+
+        return {
+            "message": "Locations processed",
+            "session_id": batch.session_id,
+            "points_logged": len(points),
+            "points_rejected": rejected,
+            "geofences_completed": len(new_ids)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in update_locations: %s", e, exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # ----------------------------------------------------------
 # GET POLYLINE FOR SESSION
 # ----------------------------------------------------------
 @app.get("/tracking/polyline/{session_id}")
-def get_polyline(session_id: int, db: Session = Depends(get_db)):
+async def get_polyline(session_id: int, db: Session = Depends(get_db_readonly)):
 
-    points = (
-        db.query(UserLocation)
-        .filter(UserLocation.session_id == session_id)
-        .order_by(UserLocation.timestamp.asc())
-        .all()
+    # Plain (lat, lng, timestamp) tuples, serialized straight to orjson
+    points = await run_in_threadpool(
+        lambda: db.execute(_STMT_POLYLINE, {"sid": session_id}).all()
     )
 
-    return [
+    return ORJSONResponse([
         {
-            "lat": p.lat,
-            "lng": p.lng,
-            "timestamp": p.timestamp
+            "lat": lat,
+            "lng": lng,
+            "timestamp": timestamp
         }
-        for p in points
-    ]
+        for lat, lng, timestamp in points
+    ])
+
+
+# ----------------------------------------------------------
+# GET ENCODED POLYLINE FOR SESSION (built in PostGIS)
+# ----------------------------------------------------------
+@app.get("/tracking/polyline/{session_id}/encoded")
+async def get_encoded_polyline(session_id: int, db: Session = Depends(get_db_readonly)):
+
+    # Google encoded polyline string (lat/lng, precision 5), null when no points
+    encoded = await run_in_threadpool(
+        lambda: db.execute(_STMT_ENCODED_POLYLINE, {"sid": session_id}).scalar()
+    )
+
+    return {"polyline": encoded}
 
 # ----------------------------------------------------------
 # GEOFENCE CREATE BY ADMIN
@@ -477,11 +888,13 @@ def create_geofence(data: GeofenceCreate, db: Session = Depends(get_db)):
         name=data.name,
         center_lat=data.center_lat,
         center_lng=data.center_lng,
-        radius_m=data.radius_m
+        radius_m=data.radius_m,
+        cells=geofence_cells(data.center_lat, data.center_lng, data.radius_m)
     )
     db.add(gf)
+    store_cell_geometries(db, gf.cells)
     db.commit()
-    db.refresh(gf)
+    geofence_cache.refresh(db)
 
     return {
         "message": "Geofence created",
@@ -489,6 +902,23 @@ def create_geofence(data: GeofenceCreate, db: Session = Depends(get_db)):
     }
 
 
+# ----------------------------------------------------------
+# GEOFENCE H3 CELLS AS VECTOR TILES (MapLibre / Mapbox GL)
+# ----------------------------------------------------------
+@app.get("/tiles/geofence-cells/{z}/{x}/{y}.pbf")
+async def geofence_cell_tile(z: int, x: int, y: int, db: Session = Depends(get_db_readonly)):
+
+    tile = await run_in_threadpool(
+        lambda: db.execute(_STMT_GEOFENCE_CELL_TILE, {"z": z, "x": x, "y": y}).scalar()
+    )
+
+    return Response(
+        content=bytes(tile or b""),
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": "public, max-age=300"},
+    )
+
+
 # ----------------------------------------------------------
 # GEOFENCE DELETE BY ADMIN
 # ----------------------------------------------------------
@@ -510,6 +940,7 @@ def delete_geofence(geofence_id: int, db: Session = Depends(get_db)):
 
     db.delete(geofence)
     db.commit()
+    geofence_cache.refresh(db)
 
     return {
         "message": "Geofence deleted",
@@ -517,21 +948,40 @@ def delete_geofence(geofence_id: int, db: Session = Depends(get_db)):
     }
 
 
+# ----------------------------------------------------------
+# GEOFENCES CONTAINING A POINT (GIN cell lookup + PostGIS ST_DWithin)
+# ----------------------------------------------------------
+@app.get("/geofence/containing")
+async def geofences_containing(lat: float, lng: float, db: Session = Depends(get_db_readonly)):
+
+    hits = await run_in_threadpool(geofences_within, db, lat, lng)
+
+    return [
+        {
+            "geofence_id": gf_id,
+            "name": gf_name
+        }
+        for gf_id, gf_name in hits
+    ]
+
+
 # ----------------------------------------------------------
 # ODOMETER CHECK-OUT (END SESSION) AND DAILY SUMMARY
 # ----------------------------------------------------------
 
 @app.post("/session/checkout")
-def checkout_session(
+async def checkout_session(
     session_id: int = Form(...),
     odometer: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
+    await _require_image(odometer, "Odometer")
+
     # --------------------------------------------------
     # 1️⃣ Validate session
     # --------------------------------------------------
-    session = (
-        db.query(UserSession)
+    session = await run_in_threadpool(
+        lambda: db.query(UserSession)
         .filter(UserSession.id == session_id)
         .first()
     )
@@ -543,67 +993,93 @@ def checkout_session(
 
     # --------------------------------------------------
     # 2️⃣ Upload odometer end image
+    # 3️⃣ OCR extract odometer mileage (Gemini, dedicated OCR pool)
     # --------------------------------------------------
-    odo_end_url = upload_odometer(odometer)
+    odo_end_url, odo_end_value = await process_odometer(odometer)
     if not odo_end_url:
         return {"error": "Odometer upload failed"}
 
-    # --------------------------------------------------
-    # 3️⃣ OCR extract odometer mileage (Gemini)
-    # --------------------------------------------------
-    odo_end_value = extract_odometer_mileage(odometer)
-
-    # --------------------------------------------------
-    # 4️⃣ Close session
-    # --------------------------------------------------
-    session.check_out_time = datetime.utcnow() # type: ignore
-    session.odometer_end_image_url = odo_end_url # type: ignore
-    session.odometer_end_value = odo_end_value  # type: ignore
-
-    odo_start = session.odometer_start_value or 0.0
-    odo_distance = max(odo_end_value - odo_start, 0.0)
+    # Write any queued polyline points so the GPS distance covers the whole track;
+    # a failed flush only makes the GPS distance short, so don't fail checkout on it
+    try:
+        await location_buffer.flush()
+    except Exception as exc:
+        logger.error(f"Polyline flush before checkout failed: {exc}", exc_info=True)
 
-    db.commit()
+    def close_session():
+        # --------------------------------------------------
+        # 4️⃣ Close session
+        # --------------------------------------------------
+        session.check_out_time = utc_now() # type: ignore
+        session.odometer_end_image_url = odo_end_url # type: ignore
+        session.odometer_end_value = odo_end_value  # type: ignore
 
-    # --------------------------------------------------
-    # 5️⃣ Count completed geofences
-    # --------------------------------------------------
-    geofence_count = (
-        db.query(GeofenceStatus)
-        .filter(
-            GeofenceStatus.session_id == session.id,
-            GeofenceStatus.completed == True
-        )
-        .count()
-    )
+        odo_start = session.odometer_start_value or 0.0
+        odo_distance = max(odo_end_value - odo_start, 0.0)
 
-    # --------------------------------------------------
-    # 6️⃣ Create DAILY SUMMARY (DAY 6 CORE)
-    # --------------------------------------------------
-    summary = DailySummary(
-        employee_id=session.employee_id,
-        date=date.today(),
+        # Distance along the logged polyline, one vectorized haversine over all segments
+        points = db.execute(_STMT_POLYLINE, {"sid": session_id}).all()
+        gps_distance = path_length_km([p.lat for p in points], [p.lng for p in points])
 
-        total_distance = round(odo_distance, 3), # type: ignore
-        odometer_start=odo_start,
-        odometer_end=odo_end_value,
-        
+        # --------------------------------------------------
+        # 5️⃣ Count completed geofences
+        # --------------------------------------------------
+        geofence_count = db.execute(
+            select(func.count())
+            .select_from(GeofenceStatus)
+            .where(
+                GeofenceStatus.session_id == session.id,
+                GeofenceStatus.completed == True
+            )
+        ).scalar_one()
 
-        geofence_count=geofence_count,
+        # --------------------------------------------------
+        # 6️⃣ Create / extend DAILY SUMMARY (DAY 6 CORE)
+        # --------------------------------------------------
+        # A later session the same day adds to the existing row instead of hitting
+        # uq_daily_summary_employee_date (which would also roll back the close)
+        stmt = pg_insert(DailySummary).values(
+            employee_id=session.employee_id,
+            date=date.today(),
+
+            total_distance = round(odo_distance, 3), # type: ignore
+            odometer_start=odo_start,
+            odometer_end=odo_end_value,
+
+            geofence_count=geofence_count,
+
+            start_lat=session.start_lat,
+            start_lng=session.start_lng,
+            end_lat=session.end_lat,
+            end_lng=session.end_lng
+        )
+        db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_daily_summary_employee_date",
+                set_={
+                    "total_distance": func.coalesce(DailySummary.total_distance, 0) + stmt.excluded.total_distance,
+                    "odometer_start": func.coalesce(DailySummary.odometer_start, stmt.excluded.odometer_start),
+                    "odometer_end": stmt.excluded.odometer_end,
+                    "geofence_count": func.coalesce(DailySummary.geofence_count, 0) + stmt.excluded.geofence_count,
+                    "start_lat": func.coalesce(DailySummary.start_lat, stmt.excluded.start_lat),
+                    "start_lng": func.coalesce(DailySummary.start_lng, stmt.excluded.start_lng),
+                    "end_lat": stmt.excluded.end_lat,
+                    "end_lng": stmt.excluded.end_lng,
+                },
+            )
+        )
 
-        start_lat=session.start_lat,
-        start_lng=session.start_lng,
-        end_lat=session.end_lat,
-        end_lng=session.end_lng
-    )
+        # Session close + summary in one transaction
+        db.commit()
+        return odo_distance, gps_distance, geofence_count
 
-    db.add(summary)
-    db.commit()
+    odo_distance, gps_distance, geofence_count = await run_in_threadpool(close_session)
 
     return {
         "message": "Session checked out successfully",
-        "session_id": session.id,
+        "session_id": session_id,
         "odometer_distance_km": round(odo_distance, 3), # type: ignore
+        "gps_distance_km": round(gps_distance, 3),
         "geofence_count": geofence_count
     }
 
@@ -619,13 +1095,19 @@ def checkout_session(
 # ----------------------------------------------------------
 
 @app.get("/summary/{employee_id}")
-def get_daily_summary(employee_id: int, db: Session = Depends(get_db)):
-
-    summaries = (
-        db.query(DailySummary)
-        .filter(DailySummary.employee_id == employee_id)
-        .order_by(DailySummary.date.desc())
-        .all()
+async def get_daily_summary(employee_id: int, db: Session = Depends(get_db_readonly)):
+
+    summaries = await run_in_threadpool(
+        lambda: db.execute(
+            select(
+                DailySummary.date, DailySummary.total_distance,
+                DailySummary.odometer_start, DailySummary.odometer_end,
+                DailySummary.start_lat, DailySummary.start_lng,
+                DailySummary.end_lat, DailySummary.end_lng,
+            )
+            .where(DailySummary.employee_id == employee_id)
+            .order_by(DailySummary.date.desc())
+        ).all()
     )
 
     return [
@@ -645,74 +1127,81 @@ def get_daily_summary(employee_id: int, db: Session = Depends(get_db)):
 # SUMMARY REPORT OF ALL EMPLOYEES FOR TODAY
 # ----------------------------------------------------------
 @app.get("/admin/summary/today")
-def today_summary(db: Session = Depends(get_db)):
+async def today_summary(db: Session = Depends(get_db_readonly)):
     today = date.today()
 
-    summaries = (
-        db.query(DailySummary)
-        .filter(DailySummary.date == today)
-        .all()
+    summaries = await run_in_threadpool(
+        lambda: db.execute(
+            select(DailySummary.__table__).where(DailySummary.date == today)
+        ).mappings().all()
     )
 
-    return summaries
+    return [dict(s) for s in summaries]
 
 
 # ----------------------------------------------------------
 # SUMMARY REPORT OF ALL EMPLOYEES FOR YESTERDAY
 # ----------------------------------------------------------
 @app.get("/admin/summary/yesterday")
-def yesterday_summary(db: Session = Depends(get_db)):
+async def yesterday_summary(db: Session = Depends(get_db_readonly)):
     yesterday = date.today() - timedelta(days=1)
 
-    summaries = (
-        db.query(DailySummary)
-        .filter(DailySummary.date == yesterday)
-        .all()
+    summaries = await run_in_threadpool(
+        lambda: db.execute(
+            select(DailySummary.__table__).where(DailySummary.date == yesterday)
+        ).mappings().all()
     )
 
-    return summaries
+    return [dict(s) for s in summaries]
 
 # ----------------------------------------------------------
 # SUMMARY REPORT OF ALL EMPLOYEES FOR THE WEEK
 # ----------------------------------------------------------
 @app.get("/admin/summary/weekly")
-def weekly_summary(db: Session = Depends(get_db)):
+async def weekly_summary(db: Session = Depends(get_db_readonly)):
     start_date = date.today() - timedelta(days=7)
 
-    summaries = (
-        db.query(DailySummary)
-        .filter(DailySummary.date >= start_date)
-        .order_by(DailySummary.date.desc())
-        .all()
+    summaries = await run_in_threadpool(
+        lambda: db.execute(
+            select(DailySummary.__table__)
+            .where(DailySummary.date >= start_date)
+            .order_by(DailySummary.date.desc())
+        ).mappings().all()
     )
 
-    return summaries
+    return [dict(s) for s in summaries]
 
 # ----------------------------------------------------------
 # SUMMARY REPORT FOR A SPECIFIC EMPLOYEE
 # ----------------------------------------------------------
 @app.get("/admin/summary/employee/{employee_id}")
-def employee_summary(employee_id: int, db: Session = Depends(get_db)):
-    summaries = (
-        db.query(DailySummary)
-        .filter(DailySummary.employee_id == employee_id)
-        .order_by(DailySummary.date.desc())
-        .all()
+async def employee_summary(employee_id: int, db: Session = Depends(get_db_readonly)):
+    summaries = await run_in_threadpool(
+        lambda: db.execute(
+            select(DailySummary.__table__)
+            .where(DailySummary.employee_id == employee_id)
+            .order_by(DailySummary.date.desc())
+        ).mappings().all()
     )
-    return summaries
+    return [dict(s) for s in summaries]
 
 
 # ----------------------------------------------------------
 # ALL SESSIONS REPORT FOR A SPECIFIC EMPLOYEE
 # ----------------------------------------------------------
 @app.get("/admin/employee/{employee_id}/sessions")
-def get_employee_sessions(employee_id: int, db: Session = Depends(get_db)):
-
-    sessions = (
-        db.query(UserSession)
-        .filter(UserSession.employee_id == employee_id)
-        .order_by(UserSession.check_in_time.desc())
-        .all()
+async def get_employee_sessions(employee_id: int, db: Session = Depends(get_db_readonly)):
+
+    sessions = await run_in_threadpool(
+        lambda: db.execute(
+            select(
+                UserSession.id, UserSession.check_in_time, UserSession.check_out_time,
+                UserSession.start_lat, UserSession.start_lng,
+                UserSession.end_lat, UserSession.end_lng,
+            )
+            .where(UserSession.employee_id == employee_id)
+            .order_by(UserSession.check_in_time.desc())
+        ).all()
     )
 
     return [
@@ -731,12 +1220,19 @@ def get_employee_sessions(employee_id: int, db: Session = Depends(get_db)):
 # PARTICULAR SESSION DETAILS REPORT
 # ----------------------------------------------------------
 @app.get("/admin/session/{session_id}")
-def get_session_details(session_id: int, db: Session = Depends(get_db)):
-
-    session = (
-        db.query(UserSession)
-        .filter(UserSession.id == session_id)
-        .first()
+async def get_session_details(session_id: int, db: Session = Depends(get_db_readonly)):
+
+    session = await run_in_threadpool(
+        lambda: db.execute(
+            select(
+                UserSession.id, UserSession.employee_id,
+                UserSession.check_in_time, UserSession.check_out_time,
+                UserSession.odometer_start_value, UserSession.odometer_end_value,
+                UserSession.start_lat, UserSession.start_lng,
+                UserSession.end_lat, UserSession.end_lng,
+            )
+            .where(UserSession.id == session_id)
+        ).first()
     )
 
     if not session:
@@ -758,32 +1254,30 @@ def get_session_details(session_id: int, db: Session = Depends(get_db)):
 # SESSION POLYLINE REPORT (ADMIN CAN SEE THE SESSION PATH ON MAP)
 # ----------------------------------------------------------
 @app.get("/admin/session/{session_id}/polyline")
-def get_session_polyline(session_id: int, db: Session = Depends(get_db)):
+async def get_session_polyline(session_id: int, db: Session = Depends(get_db_readonly)):
 
-    points = (
-        db.query(UserLocation)
-        .filter(UserLocation.session_id == session_id)
-        .order_by(UserLocation.timestamp.asc())
-        .all()
+    # Plain (lat, lng, timestamp) tuples, serialized straight to orjson
+    points = await run_in_threadpool(
+        lambda: db.execute(_STMT_POLYLINE, {"sid": session_id}).all()
     )
 
-    return [
+    return ORJSONResponse([
         {
-            "lat": p.lat,
-            "lng": p.lng,
-            "timestamp": p.timestamp
+            "lat": lat,
+            "lng": lng,
+            "timestamp": timestamp
         }
-        for p in points
-    ]
+        for lat, lng, timestamp in points
+    ])
 
 
 # ----------------------------------------------------------
 # LIST ALL GEOFENCES(I DONT KNOW WHY THIS IS NEEDED)
 # ----------------------------------------------------------
 @app.get("/admin/geofences")
-def list_geofences(db: Session = Depends(get_db)):
+async def list_geofences(db: Session = Depends(get_db_readonly)):
 
-    geofences = db.query(Geofence).all()
+    geofences = await run_in_threadpool(lambda: db.query(Geofence).all())
 
     return [
         {
@@ -800,10 +1294,10 @@ def list_geofences(db: Session = Depends(get_db)):
 # LIST ALL GEOFENCES COMPLETIONS FOR A PARTICULAR SESSION (I DONT KNOW WHY THIS IS NEEDED)
 # ----------------------------------------------------------
 @app.get("/admin/session/{session_id}/geofences")
-def geofence_completion(session_id: int, db: Session = Depends(get_db)):
+async def geofence_completion(session_id: int, db: Session = Depends(get_db_readonly)):
 
-    statuses = (
-        db.query(GeofenceStatus)
+    statuses = await run_in_threadpool(
+        lambda: db.query(GeofenceStatus)
         .filter(GeofenceStatus.session_id == session_id)
         .all()
     )
@@ -823,13 +1317,18 @@ def geofence_completion(session_id: int, db: Session = Depends(get_db)):
 # ----------------------------------------------------------
 
 @app.get("/admin/live-location/{session_id}")
-def get_live_location(session_id: int, db: Session = Depends(get_db)):
+async def get_live_location(session_id: int, db: Session = Depends(get_db_readonly)):
 
-    point = (
-        db.query(UserLocation)
-        .filter(UserLocation.session_id == session_id)
-        .order_by(UserLocation.timestamp.desc())
-        .first()
+    if redis_client is not None:
+        try:
+            cached = await redis_client.get(f"sess:{session_id}:last")
+            if cached is not None:
+                return orjson.loads(cached)
+        except Exception as exc:
+            logger.warning(f"Redis last-seen read failed, using DB: {exc}")
+
+    point = await run_in_threadpool(
+        lambda: db.execute(_STMT_LAST_POINT, {"sid": session_id}).first()
     )
 
     if not point:
@@ -850,7 +1349,16 @@ def get_live_location(session_id: int, db: Session = Depends(get_db)):
 @app.delete("/admin/cleanup/gps")
 def cleanup_old_gps(db: Session = Depends(get_db)):
 
-    cutoff = datetime.utcnow() - timedelta(days=30)
+    # Partitioned table: expired days are dropped whole, no row-by-row DELETE
+    result = run_partition_maintenance(engine)
+    if result is not None:
+        return {
+            "message": "Old GPS logs cleaned",
+            "partitions_dropped": result["dropped"],
+            "partitions_created": result["created"]
+        }
+
+    cutoff = utc_now() - timedelta(days=30)
 
     deleted = (
         db.query(UserLocation)
@@ -871,90 +1379,113 @@ def cleanup_old_gps(db: Session = Depends(get_db)):
 # ----------------------------------------------------------
 
 @app.post("/admin/assign-geofence")
-def assign_geofence(data: GeofenceAssignmentCreate, db: Session = Depends(get_db)):
-    assignment = GeofenceAssignment(
-        employee_id=data.employee_id,
-        geofence_id=data.geofence_id,
-        assigned_date=data.assigned_date,
-        assigned_by=None  # Will be set from auth context later
-    )
-    db.add(assignment)
-    db.commit()
-    db.refresh(assignment)
+async def assign_geofence(data: GeofenceAssignmentCreate, db: Session = Depends(get_db)):
+
+    def insert_assignment():
+        # INSERT ... RETURNING id: no refresh round-trip after the commit
+        assignment_id = db.execute(
+            insert(GeofenceAssignment)
+            .values(
+                employee_id=data.employee_id,
+                geofence_id=data.geofence_id,
+                assigned_date=data.assigned_date,
+                assigned_by=None  # Will be set from auth context later
+            )
+            .returning(GeofenceAssignment.id)
+        ).scalar_one()
+        db.commit()
+        return assignment_id
+
+    assignment_id = await run_in_threadpool(insert_assignment)
     return {
         "message": "Geofence assigned",
-        "assignment_id": assignment.id
+        "assignment_id": assignment_id
     }
 
 
 @app.delete("/admin/assignment/{assignment_id}")
-def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
+async def delete_assignment(assignment_id: int, db: Session = Depends(get_db)):
     """Delete a geofence assignment"""
-    assignment = db.query(GeofenceAssignment).filter(
-        GeofenceAssignment.id == assignment_id
-    ).first()
-    
-    if not assignment:
+
+    def delete_row():
+        deleted = db.execute(
+            delete(GeofenceAssignment).where(GeofenceAssignment.id == assignment_id)
+        ).rowcount
+        db.commit()
+        return deleted
+
+    if not await run_in_threadpool(delete_row):
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    db.delete(assignment)
-    db.commit()
     return {"message": "Assignment deleted successfully"}
 
 
+def _find_employee(db: Session, identifier: str, *columns):
+    """Row of `columns` for the employee matching identifier as ID or code, in one query.
+
+    Numeric identifiers match either column; an ID match wins over a code match.
+    """
+    stmt = select(*columns).limit(1)
+    try:
+        emp_id = int(identifier)
+    except ValueError:
+        return db.execute(stmt.where(Employee.employee_code == identifier)).first()
+    return db.execute(
+        stmt.where(or_(Employee.id == emp_id, Employee.employee_code == identifier))
+        .order_by((Employee.id == emp_id).desc())
+    ).first()
+
+
 @app.get("/employee/{employee_identifier}/targets")
-def get_employee_targets(employee_identifier: str, db: Session = Depends(get_db)):
+async def get_employee_targets(employee_identifier: str, db: Session = Depends(get_db_readonly)):
     """Get today's geofence targets for an employee (by ID or code)"""
     today = date.today()
     
-    # Try to find employee by ID first, then by code
-    employee = None
-    try:
-        emp_id = int(employee_identifier)
-        employee = db.query(Employee).filter(Employee.id == emp_id).first()
-    except ValueError:
-        # Not a number, try by code
-        employee = db.query(Employee).filter(Employee.employee_code == employee_identifier).first()
+    employee = await run_in_threadpool(_find_employee, db, employee_identifier, Employee.id)
     
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
+    employee_id = employee.id
     
-    assignments = (
-        db.query(GeofenceAssignment)
+    # One JOIN instead of a Geofence lookup per assignment; the inner join
+    # drops assignments whose geofence was deleted, as the old loop did
+    rows = await run_in_threadpool(
+        lambda: db.query(
+            GeofenceAssignment.id,
+            GeofenceAssignment.assigned_date,
+            Geofence.id.label("geofence_id"),
+            Geofence.name,
+            Geofence.center_lat,
+            Geofence.center_lng,
+            Geofence.radius_m,
+        )
+        .join(Geofence, Geofence.id == GeofenceAssignment.geofence_id)
         .filter(
-            GeofenceAssignment.employee_id == employee.id,
+            GeofenceAssignment.employee_id == employee_id,
             GeofenceAssignment.assigned_date == today
         )
         .all()
     )
     
-    result = []
-    for assign in assignments:
-        geofence = db.query(Geofence).filter(Geofence.id == assign.geofence_id).first()
-        if geofence:
-            result.append({
-                "assignment_id": assign.id,
-                "geofence_id": geofence.id,
-                "geofence_name": geofence.name,
-                "center": [geofence.center_lat, geofence.center_lng],
-                "radius_m": geofence.radius_m,
-                "assigned_date": assign.assigned_date
-            })
-    
-    return result
+    return [
+        {
+            "assignment_id": r.id,
+            "geofence_id": r.geofence_id,
+            "geofence_name": r.name,
+            "center": [r.center_lat, r.center_lng],
+            "radius_m": r.radius_m,
+            "assigned_date": r.assigned_date
+        }
+        for r in rows
+    ]
 
 
 @app.get("/employee/{employee_identifier}/info")
-def get_employee_info(employee_identifier: str, db: Session = Depends(get_db)):
+async def get_employee_info(employee_identifier: str, db: Session = Depends(get_db_readonly)):
     """Get employee name for welcome screen (by ID or code)"""
-    # Try to find employee by ID first, then by code
-    employee = None
-    try:
-        emp_id = int(employee_identifier)
-        employee = db.query(Employee).filter(Employee.id == emp_id).first()
-    except ValueError:
-        # Not a number, try by code
-        employee = db.query(Employee).filter(Employee.employee_code == employee_identifier).first()
+    employee = await run_in_threadpool(
+        _find_employee, db, employee_identifier, Employee.id, Employee.name, Employee.employee_code
+    )
     
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
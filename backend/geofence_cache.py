@@ -0,0 +1,225 @@
+import threading
+import time
+import numpy as np
+from h3.api import basic_int as h3
+from sqlalchemy import BigInteger, cast, func, text
+from sqlalchemy.dialects.postgresql import ARRAY, array, insert as pg_insert
+from sqlalchemy.orm import Session
+from geoalchemy2 import Geography
+from geoalchemy2.elements import WKTElement
+
+from models import Geofence, H3Cell
+
+# Mean earth radius (same value the `haversine` package used)
+EARTH_RADIUS_KM = 6371.0088
+
+# Other workers' create/delete calls are picked up after at most this long
+CACHE_TTL_S = 60.0
+
+# Each geofence circle is also filled with cells at this resolution (~76 m edge).
+# Any point is within one cell circumradius of its cell's center, so filling the
+# circle grown by this margin yields a cell set that covers the whole geofence.
+GEOFENCE_CELLS_RES = 10
+CELLS_MARGIN_M = 100.0
+
+
+# --------------------------------------------------
+# VECTORIZED DISTANCE
+# --------------------------------------------------
+def haversine_np(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Great-circle distance in km between broadcastable arrays of degrees."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def path_length_km(lats, lngs) -> float:
+    """Total length of an ordered GPS track, summing every consecutive segment at once."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    if len(lats) < 2:
+        return 0.0
+    return float(haversine_np(lats[:-1], lngs[:-1], lats[1:], lngs[1:]).sum())
+
+
+# --------------------------------------------------
+# GEOFENCE CACHE (vectorized containment check)
+# --------------------------------------------------
+class GeofenceCache:
+    """Column arrays of every geofence, kept in memory for the location-update hot path.
+
+    Refresh after any geofence create/delete; lookups never touch the database.
+    Snapshots older than CACHE_TTL_S are reloaded so changes made through
+    another worker process are seen too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._snapshot = (
+            np.empty(0, dtype=np.int64),    # ids
+            [],                             # names
+            np.empty(0, dtype=np.float64),  # lat_rad
+            np.empty(0, dtype=np.float64),  # lng_rad
+            np.empty(0, dtype=np.float64),  # radius_km
+        )
+        self.loaded = False
+        self.generation = 0
+        self._loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def refresh(self, db: Session):
+        rows = db.query(
+            Geofence.id, Geofence.name, Geofence.center_lat, Geofence.center_lng, Geofence.radius_m
+        ).all()
+
+        ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+        names = [r.name for r in rows]
+        lat_rad = np.radians(np.fromiter((r.center_lat for r in rows), dtype=np.float64, count=len(rows)))
+        lng_rad = np.radians(np.fromiter((r.center_lng for r in rows), dtype=np.float64, count=len(rows)))
+        radius_km = np.fromiter((r.radius_m for r in rows), dtype=np.float64, count=len(rows)) / 1000.0
+
+        # Swap the whole snapshot at once so readers never see mixed arrays
+        with self._lock:
+            self._snapshot = (ids, names, lat_rad, lng_rad, radius_km)
+            self.loaded = True
+            self.generation += 1
+            self._loaded_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self._loaded_at > CACHE_TTL_S
+
+    def refresh_if_stale(self, db: Session):
+        # Only one request reloads; concurrent ones keep using the current snapshot
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if self.is_stale():
+                self.refresh(db)
+        finally:
+            self._refresh_lock.release()
+
+    def containing(self, lat: float, lng: float) -> list[tuple[int, str]]:
+        """Return (id, name) of every geofence whose circle contains the point."""
+        ids, names, lat_rad, lng_rad, radius_km = self._snapshot
+        if not len(ids):
+            return []
+
+        plat = np.radians(lat)
+        plng = np.radians(lng)
+        dlat = lat_rad - plat
+        dlng = lng_rad - plng
+        a = np.sin(dlat / 2) ** 2 + np.cos(plat) * np.cos(lat_rad) * np.sin(dlng / 2) ** 2
+        dist_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+        inside = np.flatnonzero(dist_km <= radius_km)
+        return [(int(ids[i]), names[i]) for i in inside]
+
+
+geofence_cache = GeofenceCache()
+
+
+# --------------------------------------------------
+# H3 BUCKETS
+# --------------------------------------------------
+def geofence_cells(lat: float, lng: float, radius_m: float) -> list[int]:
+    """Res-10 cells whose centers fall inside the geofence circle grown by CELLS_MARGIN_M."""
+    reach_deg = np.degrees((radius_m + CELLS_MARGIN_M) / (EARTH_RADIUS_KM * 1000.0))
+    theta = np.linspace(0.0, 2 * np.pi, 64, endpoint=False)
+    ring = np.column_stack((
+        lat + reach_deg * np.sin(theta),
+        lng + reach_deg * np.cos(theta) / np.cos(np.radians(lat)),
+    ))
+    return h3.h3shape_to_cells(h3.LatLngPoly(ring.tolist()), GEOFENCE_CELLS_RES)
+
+
+def _cell_polygon_wkt(cell: int) -> WKTElement:
+    # cell_to_boundary is (lat, lng); WKT rings are closed (lng lat)
+    ring = [f"{lng} {lat}" for lat, lng in h3.cell_to_boundary(cell)]
+    ring.append(ring[0])
+    return WKTElement(f"POLYGON(({', '.join(ring)}))", srid=4326)
+
+
+def store_cell_geometries(db: Session, cells) -> None:
+    """Insert hexagon boundaries for cells not yet in h3_cells (caller commits)."""
+    cells = list(cells)
+    if cells:
+        db.execute(
+            pg_insert(H3Cell)
+            .values([{"h3": c, "geom": _cell_polygon_wkt(c)} for c in cells])
+            .on_conflict_do_nothing(index_elements=["h3"])
+        )
+
+
+def backfill_h3(db: Session) -> int:
+    """Fill cells for geofences created before that column existed (see migrate.py; caller commits)."""
+    rows = (
+        db.query(Geofence)
+        .filter(Geofence.cells.is_(None))
+        .all()
+    )
+    for gf in rows:
+        gf.cells = geofence_cells(gf.center_lat, gf.center_lng, gf.radius_m)
+    db.flush()
+
+    # Seed hexagon geometry for every geofence once, when the tile table is new
+    if db.query(H3Cell.h3).first() is None:
+        missing = set()
+        for (cells,) in db.query(Geofence.cells).filter(Geofence.cells.isnot(None)):
+            missing.update(cells)
+    else:
+        missing = {c for gf in rows for c in gf.cells}
+    store_cell_geometries(db, missing)
+    return len(rows)
+
+
+# --------------------------------------------------
+# POSTGIS LOOKUP (cache not loaded yet)
+# --------------------------------------------------
+def geofences_within(db: Session, lat: float, lng: float) -> list[tuple[int, str]]:
+    """Return (id, name) of geofences containing the point (GIN cell lookup + ST_DWithin).
+
+    Candidates are narrowed with a GIN lookup of the point's res-10 cell in each
+    geofence's covering cell array (NOT NULL, see migrate.py); ST_DWithin with the
+    per-row radius then does the exact check on that short list.
+    """
+    user_cell = h3.latlng_to_cell(lat, lng, GEOFENCE_CELLS_RES)
+    point = cast(func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326), Geography)
+    rows = (
+        db.query(Geofence.id, Geofence.name)
+        .filter(
+            Geofence.cells.contains(cast(array([user_cell]), ARRAY(BigInteger))),
+            func.ST_DWithin(Geofence.center_geog, point, Geofence.radius_m),
+        )
+        .all()
+    )
+    return [(r.id, r.name) for r in rows]
+
+
+# One row per (point, containing geofence); WITH ORDINALITY numbers the points from 1
+_STMT_WITHIN_MANY = text("""
+    SELECT p.i, g.id
+    FROM unnest(CAST(:lats AS float8[]), CAST(:lngs AS float8[]), CAST(:cells AS bigint[]))
+         WITH ORDINALITY AS p(lat, lng, cell, i)
+    JOIN geofences g
+      ON g.cells @> ARRAY[p.cell]
+     AND ST_DWithin(g.center_geog, ST_SetSRID(ST_MakePoint(p.lng, p.lat), 4326)::geography, g.radius_m)
+    ORDER BY p.i
+""")
+
+
+def geofences_within_many(db: Session, points) -> list[tuple[int, int]]:
+    """(point index, geofence id) for every geofence containing each (lat, lng, ...) point.
+
+    Same GIN cell prefilter + ST_DWithin check as geofences_within, but one
+    query for a whole batch; rows come back in point order.
+    """
+    if not points:
+        return []
+    lats = [p[0] for p in points]
+    lngs = [p[1] for p in points]
+    cells = [h3.latlng_to_cell(lat, lng, GEOFENCE_CELLS_RES) for lat, lng in zip(lats, lngs)]
+    rows = db.execute(_STMT_WITHIN_MANY, {"lats": lats, "lngs": lngs, "cells": cells}).all()
+    return [(i - 1, gf_id) for i, gf_id in rows]
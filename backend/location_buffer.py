@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+
+from models import UserLocation
+from util import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_S = 2.0
+FLUSH_BATCH_SIZE = 500
+QUEUE_MAX_POINTS = 10_000
+# A point that fails this many flushes is dropped (e.g. a timestamp with no partition)
+FLUSH_MAX_ATTEMPTS = 3
+# Pause between the final flush passes at shutdown
+STOP_RETRY_DELAY_S = 1.0
+
+
+def _insert_rows(rows: list[dict]):
+    db = SessionLocal()
+    try:
+        # One executemany INSERT + one commit for the whole batch
+        db.execute(insert(UserLocation), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _insert_rows_individually(rows: list[dict]) -> list[int]:
+    """Insert each row under its own savepoint; returns indexes of the rows that failed."""
+    db = SessionLocal()
+    failed = []
+    try:
+        for i, row in enumerate(rows):
+            try:
+                with db.begin_nested():
+                    db.execute(insert(UserLocation), [row])
+            except Exception:
+                failed.append(i)
+        db.commit()
+    finally:
+        db.close()
+    return failed
+
+
+# --------------------------------------------------
+# POLYLINE WRITE BUFFER
+# --------------------------------------------------
+class LocationBuffer:
+    """Bounded in-process queue of polyline points, flushed to user_locations in batches.
+
+    `put` never blocks: once the queue is full (database stalled) new points are
+    shed and counted in `dropped` instead of holding up request handlers.
+    A failed batch is retried row by row so one bad point can't take the rest
+    with it; rows that still fail are requeued for the next flush, up to
+    FLUSH_MAX_ATTEMPTS.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.dropped = 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=QUEUE_MAX_POINTS)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._queue is None:
+            return
+
+        # Each pass gives requeued rows another attempt, so after FLUSH_MAX_ATTEMPTS
+        # passes every point has been written or dropped
+        for attempt in range(FLUSH_MAX_ATTEMPTS):
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error(f"Polyline flush failed at shutdown: {exc}", exc_info=True)
+            if self._queue.empty():
+                return
+            if attempt + 1 < FLUSH_MAX_ATTEMPTS:
+                await asyncio.sleep(STOP_RETRY_DELAY_S)
+        logger.error(f"Shutting down with {self._queue.qsize()} polyline points unwritten")
+
+    def put(self, row: dict) -> bool:
+        """Queue a point for the next flush; False (and counted) if the queue is full."""
+        try:
+            # Queue items are (failed attempts, row)
+            self._queue.put_nowait((0, row))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Polyline buffer full, dropped point ({self.dropped} dropped so far)")
+            return False
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_S)
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error(f"Polyline flush failed: {exc}", exc_info=True)
+
+    async def flush(self):
+        if self._queue is None:
+            return
+        # Only the points queued right now; rows requeued below wait for the next flush
+        pending = self._queue.qsize()
+        while pending > 0 and not self._queue.empty():
+            batch = []
+            while pending > 0 and not self._queue.empty() and len(batch) < FLUSH_BATCH_SIZE:
+                batch.append(self._queue.get_nowait())
+                pending -= 1
+            rows = [row for _, row in batch]
+            try:
+                await run_in_threadpool(_insert_rows, rows)
+                logger.debug(f"Flushed {len(batch)} polyline points")
+                continue
+            except Exception as exc:
+                logger.warning(f"Polyline batch insert failed, retrying row by row: {exc}")
+
+            try:
+                failed = await run_in_threadpool(_insert_rows_individually, rows)
+            except Exception as exc:
+                # Couldn't even commit (database unreachable): every row is still pending
+                logger.warning(f"Polyline row-by-row insert failed: {exc}")
+                failed = range(len(batch))
+
+            dropped = 0
+            requeued = 0
+            for i in failed:
+                attempts, row = batch[i]
+                if attempts + 1 >= FLUSH_MAX_ATTEMPTS:
+                    dropped += 1
+                    continue
+                try:
+                    self._queue.put_nowait((attempts + 1, row))
+                    requeued += 1
+                except asyncio.QueueFull:
+                    dropped += 1
+            if dropped:
+                logger.error(f"Dropped {dropped} polyline points after {FLUSH_MAX_ATTEMPTS} failed inserts")
+            if requeued:
+                logger.warning(f"Requeued {requeued} polyline points for the next flush")
+
+
+location_buffer = LocationBuffer()
@@ -1,32 +1,87 @@
-import json
+from functools import lru_cache
 from pathlib import Path
+import orjson
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyroaring import BitMap64
 import folium
 import h3
+from h3.api import basic_int as h3_int
+from shapely import from_wkb
 from shapely.geometry import shape, Polygon, MultiPolygon
 from shapely.ops import unary_union
+from shapely.strtree import STRtree
 
-def extract_feature_by_pincode(fc: dict, pincode: str) -> dict:
+def build_pincode_index(fc: dict) -> dict[str, dict]:
+    """Map pincode -> feature (first occurrence wins, like the old linear scan)."""
+    idx = {}
     for feature in fc.get("features", []):
-        props = feature.get("properties", {})
-        if str(props.get("Pincode")) == str(pincode):
-            return feature
-    return {}
+        idx.setdefault(str(feature.get("properties", {}).get("Pincode")), feature)
+    return idx
 
-def extract_features_by_pincodes(fc: dict, pincodes: list[str]) -> list[dict]:
+def extract_feature_by_pincode(idx: dict[str, dict], pincode: str) -> dict:
+    return idx.get(str(pincode), {})
+
+def extract_features_by_pincodes(idx: dict[str, dict], pincodes: list[str]) -> list[dict]:
     """Extract multiple features by pincode list."""
-    features = []
-    for feature in fc.get("features", []):
-        props = feature.get("properties", {})
-        if str(props.get("Pincode")) in pincodes:
-            features.append(feature)
-    return features
+    return [idx[str(p)] for p in dict.fromkeys(pincodes) if str(p) in idx]
 
-def load_geojson(path: str) -> dict:
+def _geojson_path(path: str) -> Path:
     geo_path = Path(path)
     if not geo_path.exists():
         raise FileNotFoundError(f"GeoJSON file not found: {geo_path}")
-    with geo_path.open("r", encoding="utf-8") as fh:
-        return json.load(fh)
+    return geo_path
+
+def load_geojson(path: str) -> dict:
+    with _geojson_path(path).open("rb") as fh:
+        return orjson.loads(fh.read())
+
+# One row per pincode boundary (pincode, WKB, bbox), built once from the GeoJSON
+BOUNDARY_STORE = Path(__file__).resolve().parent / "pincode_boundaries.parquet"
+
+def build_boundary_store(geojson_path: str, store_path: Path = BOUNDARY_STORE) -> Path:
+    """Convert the GeoJSON into a compact parquet boundary store (one-off, dev only)."""
+    pincodes, wkbs, bboxes = [], [], []
+    for feature in load_geojson(geojson_path).get("features", []):
+        geom = shape(feature["geometry"])
+        pincodes.append(str(feature.get("properties", {}).get("Pincode")))
+        wkbs.append(geom.wkb)
+        bboxes.append(geom.bounds)
+    
+    bounds = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    pq.write_table(pa.table({
+        "pincode": pincodes,
+        "wkb": pa.array(wkbs, type=pa.binary()),
+        "minx": bounds[:, 0],
+        "miny": bounds[:, 1],
+        "maxx": bounds[:, 2],
+        "maxy": bounds[:, 3],
+    }), store_path)
+    return store_path
+
+def load_pincode_index(pincodes: list[str], geojson_path: str, store_path: Path = BOUNDARY_STORE) -> dict[str, dict]:
+    """Pincode -> feature for just the requested pincodes, read from the boundary store.
+
+    The store is (re)built when missing or older than the GeoJSON; after that,
+    lookups never parse the full FeatureCollection.
+    """
+    if not store_path.exists() or store_path.stat().st_mtime < _geojson_path(geojson_path).stat().st_mtime:
+        build_boundary_store(geojson_path, store_path)
+    
+    wanted = [str(p) for p in pincodes]
+    table = pq.read_table(
+        store_path, columns=["pincode", "wkb"], filters=[("pincode", "in", wanted)], memory_map=True
+    )
+    idx = {}
+    for pincode, wkb in zip(table.column("pincode").to_pylist(), table.column("wkb").to_pylist()):
+        if pincode not in idx:
+            idx[pincode] = {
+                "type": "Feature",
+                "properties": {"Pincode": pincode},
+                "geometry": from_wkb(wkb).__geo_interface__,
+            }
+    return idx
 
 def _shapely_to_h3_polygon(geom):
     """Convert Shapely Polygon to h3.LatLngPoly."""
@@ -37,50 +92,133 @@ def _shapely_to_h3_polygon(geom):
     if not isinstance(geom, Polygon):
         raise ValueError(f"Expected Polygon or MultiPolygon, got {type(geom)}")
     
-    # Get exterior coordinates (Shapely uses lon, lat order)
-    exterior = geom.exterior.coords[:-1]  # Remove last duplicate point
-    # Convert to (lat, lon) tuples for h3
-    outer = [(lat, lon) for lon, lat in exterior]
+    # Shapely rings are closed (lon, lat); h3 wants open (lat, lon) rings
+    outer = _ring_to_latlng(geom.exterior)
+    holes = [_ring_to_latlng(ring) for ring in geom.interiors]
     
-    return h3.LatLngPoly(outer)
+    return h3.LatLngPoly(outer, *holes)
 
-def _geometry_to_cells(geom, resolution: int) -> set:
-    """Convert Shapely geometry to H3 cells, handling both Polygon and MultiPolygon."""
-    cells = set()
-    
+def _ring_to_latlng(ring) -> list:
+    """Drop the closing point and swap columns to (lat, lon) in one NumPy step."""
+    coords = np.asarray(ring.coords, dtype=np.float64)[:-1, 1::-1]
+    return coords.tolist()
+
+def _clean_geometry(geometry: dict):
+    """Shapely geometry for a GeoJSON geometry, cleaned the same way for filling and unions.
+
+    buffer(0) heals self-intersecting boundary rings that would make GEOS fail;
+    simplify drops sub-metre slivers without changing the topology.
+    """
+    return shape(geometry).buffer(0).simplify(1e-6, preserve_topology=True)
+
+def _geometry_to_cells(geom, resolution: int) -> np.ndarray:
+    """Convert Shapely geometry to a sorted, unique uint64 array of H3 cells.
+
+    Handles both Polygon and MultiPolygon.
+    """
     if isinstance(geom, Polygon):
-        # Single polygon
-        h3_poly = _shapely_to_h3_polygon(geom)
-        cells.update(h3.h3shape_to_cells(h3_poly, resolution))
+        polys = [geom]
     elif isinstance(geom, MultiPolygon):
         # Multiple polygons - process each separately
-        for poly in geom.geoms:
-            h3_poly = _shapely_to_h3_polygon(poly)
-            cells.update(h3.h3shape_to_cells(h3_poly, resolution))
+        polys = list(geom.geoms)
     else:
         raise ValueError(f"Unsupported geometry type: {type(geom)}")
     
+    cells_list = [
+        np.asarray(h3_int.h3shape_to_cells(_shapely_to_h3_polygon(poly), resolution), dtype=np.uint64)
+        for poly in polys
+    ]
+    # Deduplicate once at the end (sorted, compact for the parquet cache)
+    return np.unique(np.concatenate(cells_list)) if cells_list else np.empty(0, dtype=np.uint64)
+
+# Per-pincode H3 fills, one parquet file per (pincode, resolution);
+# bump the version whenever _clean_geometry changes so stale fills aren't reused
+H3_CACHE_DIR = Path(__file__).resolve().parent / "h3_cache"
+H3_CACHE_VERSION = 2
+
+def _cells_cache_path(pincode, resolution: int) -> Path:
+    return H3_CACHE_DIR / f"{pincode}_{resolution}_v{H3_CACHE_VERSION}.parquet"
+
+@lru_cache(maxsize=256)
+def _read_cells(path: Path) -> np.ndarray:
+    return pq.read_table(path, columns=["h3"]).column("h3").to_numpy()
+
+def get_cells(feature: dict, resolution: int) -> np.ndarray:
+    """H3 fill of one pincode boundary, computed once and then served from disk/memory."""
+    path = _cells_cache_path(feature["properties"].get("Pincode"), resolution)
+    if path.exists():
+        return _read_cells(path)
+    
+    cells = _geometry_to_cells(_clean_geometry(feature["geometry"]), resolution)
+    H3_CACHE_DIR.mkdir(exist_ok=True)
+    pq.write_table(pa.table({"h3": cells}), path)
     return cells
 
-def _latlng_to_cell(lat: float, lng: float, resolution: int):
+def _latlng_to_cell(lat: float, lng: float, resolution: int) -> int:
     """Convert a lat/lng to an H3 cell index."""
-    return h3.latlng_to_cell(lat, lng, resolution)
+    return h3_int.latlng_to_cell(lat, lng, resolution)
 
 def _cell_boundary(cell):
     """Get boundary coordinates for an H3 cell."""
-    boundary = h3.cell_to_boundary(cell)
+    boundary = h3_int.cell_to_boundary(int(cell))
     return boundary
 
-def merge_geometries(features: list[dict]) -> dict:
+def union_features(features: list[dict]):
+    """Union feature geometries, dissolving only groups of pincodes that actually touch.
+
+    An STRtree finds intersecting pairs, a union-find groups them, and each group gets
+    one unary_union; disjoint groups are just collected into a MultiPolygon. For a
+    single contiguous area this is one unary_union call, as before.
+    """
+    geoms = [_clean_geometry(f["geometry"]) for f in features]
+    if len(geoms) == 1:
+        return geoms[0]
+    
+    parent = list(range(len(geoms)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    left, right = STRtree(geoms).query(geoms, predicate="intersects")
+    for i, j in zip(left.tolist(), right.tolist()):
+        parent[find(i)] = find(j)
+    
+    groups = {}
+    for i in range(len(geoms)):
+        groups.setdefault(find(i), []).append(geoms[i])
+    parts = [unary_union(group) for group in groups.values()]
+    if len(parts) == 1:
+        return parts[0]
+    
+    polys = []
+    for part in parts:
+        polys.extend(part.geoms if isinstance(part, MultiPolygon) else [part])
+    return MultiPolygon(polys)
+
+def _cells_feature_collection(cells) -> dict:
+    """One GeoJSON FeatureCollection of hexagon polygons, tagged with their cell id."""
+    features = []
+    for cell in cells:
+        # cell_to_boundary is (lat, lng); GeoJSON rings are closed (lng, lat)
+        ring = [[lng, lat] for lat, lng in _cell_boundary(cell)]
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {"h3": h3.int_to_str(int(cell))},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def merge_geometries(features: list[dict], merged=None) -> dict:
     """Merge multiple geometries into a single unified geometry (removes internal boundaries)."""
     if not features:
         raise ValueError("No features to merge")
     
-    # Convert all features to Shapely geometries
-    geometries = [shape(f["geometry"]) for f in features]
-    
     # Use unary_union to merge and dissolve internal boundaries
-    merged = unary_union(geometries)
+    if merged is None:
+        merged = union_features(features)
     
     # Convert back to GeoJSON-like dict
     return {
@@ -93,38 +231,43 @@ def merge_geometries(features: list[dict]) -> dict:
     }
 
 def visualize_pincode_h3(
-    geojson_fc: dict,
+    geojson_fc: dict | None,
     pincodes: str | list[str],
     h3_resolution: int,
     output_path: str = "pincode_h3.html",
     user_lat: float | None = None,
     user_lng: float | None = None,
     merge_boundaries: bool = True,
+    pincode_index: dict[str, dict] | None = None,
 ):
     """
     Visualize one or more pincodes with H3 hexagons.
     
     Args:
-        geojson_fc: GeoJSON FeatureCollection
+        geojson_fc: GeoJSON FeatureCollection (may be None when pincode_index is given)
         pincodes: Single pincode string or list of pincodes
         h3_resolution: H3 resolution level (8-12 recommended, 12 is very detailed)
         output_path: Output HTML file path
         user_lat: Optional user latitude
         user_lng: Optional user longitude
         merge_boundaries: If True, merge multiple pincodes into single boundary
+        pincode_index: Optional prebuilt pincode -> feature index (see load_pincode_index)
     """
     # Handle single pincode or list
     if isinstance(pincodes, str):
         pincodes = [pincodes]
     
+    if pincode_index is None:
+        pincode_index = build_pincode_index(geojson_fc)
+
     # Extract features
     if len(pincodes) == 1:
-        feature = extract_feature_by_pincode(geojson_fc, pincodes[0])
+        feature = extract_feature_by_pincode(pincode_index, pincodes[0])
         if not feature:
             raise ValueError(f"Pincode {pincodes[0]} not found")
         features = [feature]
     else:
-        features = extract_features_by_pincodes(geojson_fc, pincodes)
+        features = extract_features_by_pincodes(pincode_index, pincodes)
         if not features:
             raise ValueError(f"No features found for pincodes: {pincodes}")
         if len(features) != len(pincodes):
@@ -134,31 +277,19 @@ def visualize_pincode_h3(
     
     print(f"Processing {len(features)} pincode(s): {', '.join(pincodes)}")
     
-    # Merge geometries if requested
+    # Union once for the outline and map center; merge_boundaries only decides
+    # which outline is drawn below.
+    geometry = union_features(features)
     if merge_boundaries and len(features) > 1:
-        print("Merging boundaries...")
-        merged_feature = merge_geometries(features)
-        display_feature = merged_feature
-        geometry = shape(merged_feature["geometry"])
+        display_feature = merge_geometries(features, merged=geometry)
         print(f"Merged {len(features)} pincodes into single boundary")
-    else:
-        display_feature = features[0]
-        geometry = shape(display_feature["geometry"])
     
-    # Get all H3 cells from all features
     print(f"Generating H3 hexagons at resolution {h3_resolution}...")
-    all_hexagons = set()
-    
-    if merge_boundaries and len(features) > 1:
-        # Process merged geometry
-        all_hexagons = _geometry_to_cells(geometry, h3_resolution)
-    else:
-        # Process each feature separately
-        for i, feature in enumerate(features):
-            print(f"  Processing pincode {i+1}/{len(features)}...")
-            geom = shape(feature["geometry"])
-            cells = _geometry_to_cells(geom, h3_resolution)
-            all_hexagons.update(cells)
+    # Cell centers inside the union are exactly those inside some pincode, so the
+    # cached per-pincode fills can be OR-ed together instead of re-filling the union
+    all_hexagons = BitMap64()
+    for feature in features:
+        all_hexagons |= BitMap64(get_cells(feature, h3_resolution).tolist())
     
     print(f"Generated {len(all_hexagons)} H3 hexagons")
     
@@ -201,24 +332,26 @@ def visualize_pincode_h3(
                 tooltip=f"Pincode {pincode}",
             ).add_to(m)
     
-    # Add H3 cells
+    # Add H3 cells as one GeoJson layer instead of one folium.Polygon per cell
     print("Adding hexagons to map...")
-    for h in all_hexagons:
-        boundary = _cell_boundary(h)
-        folium.Polygon(
-            locations=boundary,
-            color="#0ea5e9",
-            weight=1,
-            opacity=0.8,
-            fill=True,
-            fill_opacity=0.25,
-            tooltip=h,
-        ).add_to(m)
+    folium.GeoJson(
+        _cells_feature_collection(all_hexagons),
+        name="H3 cells",
+        style_function=lambda _: {
+            "fillColor": "#0ea5e9",
+            "color": "#0ea5e9",
+            "weight": 1,
+            "opacity": 0.8,
+            "fillOpacity": 0.25,
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["h3"], labels=False),
+    ).add_to(m)
 
     # Optional: user location check
     if user_lat is not None and user_lng is not None:
         user_cell = _latlng_to_cell(user_lat, user_lng, h3_resolution)
         status = "inside" if user_cell in all_hexagons else "outside"
+        user_cell = h3.int_to_str(user_cell)
         print(f"User cell: {user_cell} -> {status.upper()}")
         folium.Marker(
             location=[user_lat, user_lng],
@@ -231,26 +364,42 @@ def visualize_pincode_h3(
     m.save(output_path)
     print(f"✓ Saved map to {output_path}")
 
-if __name__ == "__main__":
-    geojson_data = load_geojson("../All_India_pincode_Boundary-19312.geojson")
-    
-    # Example 1: Single pincode
+def main(argv: list[str] | None = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pincode boundary / H3 visualization tools (dev only)")
+    parser.add_argument("--geojson", default="../All_India_pincode_Boundary-19312.geojson", help="India pincode GeoJSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    vis = sub.add_parser("visualize", help="Render pincode(s) with their H3 fill to an HTML map")
+    vis.add_argument("pincodes", nargs="+", help="One or more pincodes, e.g. 570029")
+    vis.add_argument("--res", type=int, default=10, help="H3 resolution (start with 10, not 12!)")
+    vis.add_argument("--out", default=None, help="Output HTML path (default pincode_<first>.html)")
+    vis.add_argument("--user-lat", type=float, default=None)
+    vis.add_argument("--user-lng", type=float, default=None)
+    vis.add_argument("--no-merge", action="store_true", help="Draw each pincode outline separately")
+
+    sub.add_parser("build-store", help="Rebuild the parquet boundary store from the GeoJSON")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build-store":
+        print(f"✓ Wrote {build_boundary_store(args.geojson)}")
+        return
+
     visualize_pincode_h3(
-        geojson_fc=geojson_data,
-        pincodes="570029",
-        h3_resolution=10,  # Start with 10, not 12!
-        output_path="pincode_570029.html",
-        user_lat=12.364804547891925,
-        user_lng=76.60488544067712,
+        geojson_fc=None,
+        pincode_index=load_pincode_index(args.pincodes, args.geojson),
+        pincodes=args.pincodes,
+        h3_resolution=args.res,
+        output_path=args.out or f"pincode_{args.pincodes[0]}.html",
+        user_lat=args.user_lat,
+        user_lng=args.user_lng,
+        merge_boundaries=not args.no_merge,
     )
-    
-    # Example 2: Multiple pincodes with merged boundary
-    # visualize_pincode_h3(
-    #     geojson_fc=geojson_data,
-    #     pincodes=["570027", "570028", "570029"],
-    #     h3_resolution=10,  # Use 10 instead of 12 for faster processing
-    #     output_path="pincode_merged.html",
-    #     user_lat=12.364804547891925,
-    #     user_lng=76.60488544067712,
-    #     merge_boundaries=True,
-    # )
\ No newline at end of file
+
+# Example:
+#   python map.py visualize 570029 --res 10 --user-lat 12.364804547891925 --user-lng 76.60488544067712
+#   python map.py visualize 570027 570028 570029 --out pincode_merged.html
+if __name__ == "__main__":
+    main()
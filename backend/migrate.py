@@ -0,0 +1,143 @@
+# migrate.py
+"""One-off schema upgrades for databases created from an older Schema.txt.
+
+create_all on startup only creates missing tables, it never alters existing ones.
+Run this once per deployment, before starting the new app version:
+
+    python migrate.py                               # columns + indexes
+    python migrate.py --partition-user-locations    # also move GPS points into daily partitions
+
+Every step is idempotent, so re-running it is safe.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from util import SessionLocal, engine
+from geofence_cache import backfill_h3
+from partitions import is_partitioned, ensure_location_partitions, GPS_RETENTION_DAYS, PARTITION_DAYS_AHEAD
+
+# Generated center point + covering H3 cells for the geofence lookups
+GEOFENCE_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    "ALTER TABLE geofences ADD COLUMN IF NOT EXISTS center_geog GEOGRAPHY(Point, 4326) "
+    "GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(center_lng, center_lat), 4326)::geography) STORED",
+    "ALTER TABLE geofences ADD COLUMN IF NOT EXISTS cells BIGINT[]",
+    "CREATE INDEX IF NOT EXISTS ix_geofences_center_geog ON geofences USING GIST (center_geog)",
+    "CREATE INDEX IF NOT EXISTS ix_geofences_cells_gin ON geofences USING GIN (cells)",
+)
+
+
+def migrate_geofences() -> int:
+    """Add the geofence columns/indexes, fill cells for old rows, then make cells NOT NULL.
+
+    Runs in one transaction; returns how many geofences were backfilled.
+    """
+    db = SessionLocal()
+    try:
+        for stmt in GEOFENCE_DDL:
+            db.execute(text(stmt))
+        filled = backfill_h3(db)
+        # Every row has cells now, so geofences_within can rely on the GIN index
+        db.execute(text("ALTER TABLE geofences ALTER COLUMN cells SET NOT NULL"))
+        db.commit()
+        return filled
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+# Generated PostGIS point used by the encoded-polyline query.
+# On a plain (unpartitioned) table this rewrites it under an ACCESS EXCLUSIVE lock.
+USER_LOCATIONS_DDL = (
+    "ALTER TABLE user_locations ADD COLUMN IF NOT EXISTS geom GEOMETRY(Point, 4326) "
+    "GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lng, lat), 4326)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_userloc_session_ts ON user_locations (session_id, timestamp DESC)",
+)
+
+# Same layout as Schema.txt; reuses the old table's id sequence so ids keep counting up
+_PARTITIONED_USER_LOCATIONS = """
+CREATE TABLE user_locations (
+    id INTEGER NOT NULL DEFAULT nextval('user_locations_id_seq'),
+    employee_id INTEGER NOT NULL REFERENCES employees(id),
+    session_id INTEGER NOT NULL REFERENCES user_sessions(id),
+    lat FLOAT NOT NULL,
+    lng FLOAT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    geom GEOMETRY(Point, 4326)
+        GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lng, lat), 4326)) STORED,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp)
+"""
+
+
+def partition_user_locations(conn: Connection) -> int | None:
+    """Move a plain user_locations table into the daily-partitioned layout.
+
+    The old table is renamed to user_locations_legacy (drop it by hand once the
+    new one checks out) and the last GPS_RETENTION_DAYS of points are copied
+    over; older points would be dropped by partition maintenance anyway.
+    Returns the number of rows copied, or None if already partitioned.
+    """
+    if is_partitioned(conn):
+        return None
+
+    # Writers wait here until the swap commits, then insert into the new table
+    conn.execute(text("LOCK TABLE user_locations IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("ALTER TABLE user_locations RENAME TO user_locations_legacy"))
+    conn.execute(text("ALTER INDEX IF EXISTS user_locations_pkey RENAME TO user_locations_legacy_pkey"))
+    conn.execute(text("ALTER INDEX IF EXISTS ix_userloc_session_ts RENAME TO ix_userloc_legacy_session_ts"))
+
+    conn.execute(text(_PARTITIONED_USER_LOCATIONS))
+    conn.execute(text("ALTER SEQUENCE user_locations_id_seq OWNED BY user_locations.id"))
+    conn.execute(text("CREATE INDEX ix_userloc_session_ts ON user_locations (session_id, timestamp DESC)"))
+
+    today = datetime.now(timezone.utc).date()
+    start = today - timedelta(days=GPS_RETENTION_DAYS)
+    days = GPS_RETENTION_DAYS + PARTITION_DAYS_AHEAD
+    ensure_location_partitions(conn, start, days)
+
+    return conn.execute(
+        text(
+            "INSERT INTO user_locations (id, employee_id, session_id, lat, lng, timestamp) "
+            "SELECT id, employee_id, session_id, lat, lng, timestamp FROM user_locations_legacy "
+            "WHERE timestamp >= :start AND timestamp < :end"
+        ),
+        {"start": start, "end": start + timedelta(days=days + 1)},
+    ).rowcount
+
+
+def migrate_user_locations(partition: bool = False) -> int | None:
+    """Optionally convert to partitions, then add the geom column and index if missing."""
+    copied = None
+    with engine.begin() as conn:
+        if partition:
+            copied = partition_user_locations(conn)
+        for stmt in USER_LOCATIONS_DDL:
+            conn.execute(text(stmt))
+    return copied
+
+
+def main(argv: list[str] | None = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Upgrade an existing database to the current Schema.txt")
+    parser.add_argument(
+        "--partition-user-locations", action="store_true",
+        help="Move a plain user_locations table into daily partitions (copies the last 30 days)",
+    )
+    args = parser.parse_args(argv)
+
+    filled = migrate_geofences()
+    print(f"✓ geofences migrated ({filled} backfilled with H3 cells)")
+
+    copied = migrate_user_locations(partition=args.partition_user_locations)
+    if copied is not None:
+        print(f"✓ user_locations partitioned ({copied} points copied, old table kept as user_locations_legacy)")
+    print("✓ user_locations migrated")
+
+
+if __name__ == "__main__":
+    main()
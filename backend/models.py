@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Float,
     Boolean,
@@ -9,14 +10,21 @@ from sqlalchemy import (
     Text,
     ForeignKey,
     UniqueConstraint,
-    ARRAY
+    Index,
+    Computed,
 )
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, deferred
 from sqlalchemy.sql import text
-from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.dialects.postgresql import TIMESTAMP, ARRAY
+from geoalchemy2 import Geography, Geometry
 
 Base = declarative_base()
 
+
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime, matching the TIMESTAMP columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 # --------------------------------------------------
 # 1️⃣ ADMINS (minimal, auth later)
 # --------------------------------------------------
@@ -126,7 +134,8 @@ class UserSession(Base):
 class UserLocation(Base):
     __tablename__ = "user_locations"
 
-    id = Column(Integer, primary_key=True)
+    # Composite key: a partitioned table's primary key must include the partition column
+    id = Column(Integer, primary_key=True, autoincrement=True)
     employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
     session_id = Column(Integer, ForeignKey("user_sessions.id"), nullable=False)
 
@@ -135,8 +144,22 @@ class UserLocation(Base):
     timestamp = Column(
         TIMESTAMP,
         server_default=text("CURRENT_TIMESTAMP"),
-        default=datetime.utcnow,
+        default=utc_now,
         nullable=False,
+        primary_key=True,
+    )
+
+    # PostGIS point derived from lat/lng, used to build polylines in SQL
+    geom = Column(
+        Geometry("POINT", srid=4326, spatial_index=False),
+        Computed("ST_SetSRID(ST_MakePoint(lng, lat), 4326)", persisted=True),
+    )
+
+    # Latest-point lookups and ordered polyline reads per session;
+    # daily range partitions (see partitions.py) make the 30-day cleanup a DROP TABLE
+    __table_args__ = (
+        Index('ix_userloc_session_ts', session_id, timestamp.desc()),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
     )
 
 
@@ -153,6 +176,16 @@ class Geofence(Base):
     center_lng = Column(Float, nullable=False)
     radius_m = Column(Float, nullable=False)
 
+    # PostGIS point derived from center_lat/center_lng (GiST indexed)
+    center_geog = Column(
+        Geography("POINT", srid=4326, spatial_index=False),
+        Computed("ST_SetSRID(ST_MakePoint(center_lng, center_lat), 4326)::geography", persisted=True),
+    )
+
+    # Res-10 H3 cells covering the circle (plus a margin), GIN indexed for containment;
+    # deferred so full-row geofence loads don't pull the array
+    cells = deferred(Column(ARRAY(BigInteger), nullable=False))
+
     created_by = Column(Integer, ForeignKey("admins.id"))
     created_at = Column(
         TIMESTAMP,
@@ -162,6 +195,8 @@ class Geofence(Base):
     # Unique constraint on center coordinates
     __table_args__ = (
         UniqueConstraint('center_lat', 'center_lng', name='uq_geofence_center'),
+        Index('ix_geofences_center_geog', 'center_geog', postgresql_using='gist'),
+        Index('ix_geofences_cells_gin', 'cells', postgresql_using='gin'),
     )
 
 
@@ -200,6 +235,11 @@ class GeofenceAssignment(Base):
         server_default=text("CURRENT_TIMESTAMP")
     )
 
+    __table_args__ = (
+        # /employee/{id}/targets filters by employee and today's date
+        Index('ix_assign_emp_date', 'employee_id', 'assigned_date'),
+    )
+
 
 # --------------------------------------------------
 # 9️⃣ DAILY SUMMARY (reports)
@@ -225,3 +265,17 @@ class DailySummary(Base):
     __table_args__ = (
         UniqueConstraint('employee_id', 'date', name='uq_daily_summary_employee_date'),
     )
+
+
+# --------------------------------------------------
+# 🔟 H3 CELLS (hexagon geometry for vector tiles)
+# --------------------------------------------------
+class H3Cell(Base):
+    __tablename__ = "h3_cells"
+
+    h3 = Column(BigInteger, primary_key=True, autoincrement=False)
+    geom = Column(Geometry("POLYGON", srid=4326, spatial_index=False), nullable=False)
+
+    __table_args__ = (
+        Index('ix_h3_cells_geom', 'geom', postgresql_using='gist'),
+    )
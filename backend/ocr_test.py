@@ -1,22 +1,63 @@
 from google import genai
 from PIL import Image
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import io
 import os
+import sys
 load_dotenv()
 
 
 client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-# Load your odometer image
-img = Image.open(r"C:\GeoFence_New\Odometer_Data\odometer1.jpeg")
-
-# Prompt the model
-response = client.models.generate_content(
-    model="gemini-2.0-flash",
-    contents=[
-        "Identify the odometer in this image and extract the total mileage. "
-        "Return only the numerical value in a JSON format like {'mileage': 12345}.", 
-        img
-    ]
+
+PROMPT = (
+    "Identify the odometer in this image and extract the total mileage. "
+    "Return only the numerical value in a JSON format like {'mileage': 12345}."
 )
 
-print(response.text)
\ No newline at end of file
+# Gemini rate limits: at most this many requests in flight
+MAX_CONCURRENT = 8
+
+
+def compress_image(path: str) -> Image.Image:
+    """Downscale to fit 1024x1024 and re-encode as JPEG (fewer image tokens, smaller upload)."""
+    img = Image.open(path)
+    img.thumbnail((1024, 1024))
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="JPEG", quality=85, optimize=True)
+    buf.seek(0)
+    return Image.open(buf)
+
+
+async def ocr_one(path: str, sem: asyncio.Semaphore, cache: dict) -> str:
+    with open(path, "rb") as fh:
+        digest = hashlib.sha256(fh.read()).hexdigest()
+    # Same photo submitted twice: reuse the first answer
+    if digest not in cache:
+        cache[digest] = asyncio.ensure_future(_generate(path, sem))
+    return await cache[digest]
+
+
+async def _generate(path: str, sem: asyncio.Semaphore) -> str:
+    img = compress_image(path)
+    async with sem:
+        response = await client.aio.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=[PROMPT, img],
+        )
+    return response.text
+
+
+async def main(paths: list[str]):
+    sem = asyncio.Semaphore(MAX_CONCURRENT)
+    cache = {}
+    results = await asyncio.gather(*(ocr_one(p, sem, cache) for p in paths))
+    for path, text in zip(paths, results):
+        print(f"{path}: {text}")
+
+
+if __name__ == "__main__":
+    # Load your odometer image(s)
+    paths = sys.argv[1:] or [r"C:\GeoFence_New\Odometer_Data\odometer1.jpeg"]
+    asyncio.run(main(paths))
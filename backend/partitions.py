@@ -0,0 +1,75 @@
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# user_locations is range-partitioned by UTC day: user_locations_pYYYYMMDD
+PARTITION_PREFIX = "user_locations_p"
+PARTITION_DAYS_AHEAD = 7
+GPS_RETENTION_DAYS = 30
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass('user_locations'))"
+    )).scalar()
+
+
+def _partition_day(name: str) -> date | None:
+    if not name.startswith(PARTITION_PREFIX):
+        return None
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def ensure_location_partitions(conn: Connection, start: date, days: int = PARTITION_DAYS_AHEAD) -> list[str]:
+    """Create any missing daily partitions from start through start + days."""
+    created = []
+    for offset in range(days + 1):
+        day = start + timedelta(days=offset)
+        name = f"{PARTITION_PREFIX}{day:%Y%m%d}"
+        exists = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+        if exists:
+            continue
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF user_locations "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        ))
+        created.append(name)
+    return created
+
+
+def drop_location_partitions_before(conn: Connection, cutoff: date) -> list[str]:
+    """Drop every daily partition whose whole range ends on or before cutoff."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('user_locations')"
+    )).scalars().all()
+
+    dropped = []
+    for name in sorted(names):
+        day = _partition_day(name)
+        if day is not None and day + timedelta(days=1) <= cutoff:
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def covered_since() -> datetime:
+    """Earliest timestamp (naive UTC) run_maintenance keeps a partition for: start of yesterday."""
+    today = datetime.now(timezone.utc).date()
+    return datetime.combine(today - timedelta(days=1), datetime.min.time())
+
+
+def run_maintenance(engine: Engine) -> dict | None:
+    """Create upcoming partitions and drop expired ones; None if the table isn't partitioned."""
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return None
+        today = datetime.now(timezone.utc).date()
+        created = ensure_location_partitions(conn, today - timedelta(days=1))
+        dropped = drop_location_partitions_before(conn, today - timedelta(days=GPS_RETENTION_DAYS))
+    return {"created": created, "dropped": dropped}
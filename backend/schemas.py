@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
-from datetime import date
+from pydantic import BaseModel, Field
+from typing import Annotated, Optional
+from datetime import date, datetime
 
 
 # --------------------------------------------------
@@ -52,14 +52,29 @@ class LocationUpdate(BaseModel):
         str_strip_whitespace = True
 
 
+# --------------------------------------------------
+# 4️⃣.1 LOCATION BATCH (buffered points, one request)
+# --------------------------------------------------
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
+
+class LocationBatch(BaseModel):
+    session_id: int
+    # (lat, lng, timestamp) in the order they were recorded
+    points: list[tuple[Latitude, Longitude, datetime]] = Field(min_length=1, max_length=500)
+
+
 # --------------------------------------------------
 # 5️⃣ GEOFENCE (CIRCLE ONLY)
 # --------------------------------------------------
+# Bounds the res-10 covering cells (~5k at 5 km) inserted per geofence
+MAX_GEOFENCE_RADIUS_M = 5000
+
 class GeofenceCreate(BaseModel):
     name: str
-    center_lat: float
-    center_lng: float
-    radius_m: float
+    center_lat: Latitude
+    center_lng: Longitude
+    radius_m: float = Field(gt=0, le=MAX_GEOFENCE_RADIUS_M)
 
 
 # --------------------------------------------------
@@ -78,3 +93,15 @@ class OTPCreate(BaseModel):
     employee_id: int
     otp_code: str
     valid_for_date: date
+
+
+# --------------------------------------------------
+# 8️⃣ DIRECT UPLOADS (signed URL ticket)
+# --------------------------------------------------
+class UploadTicketRequest(BaseModel):
+    bucket: str
+    filename: str
+
+
+class OdometerOCRRequest(BaseModel):
+    url: str
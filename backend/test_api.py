@@ -1,6 +1,8 @@
+import io
 import json
 import time
 import requests
+from PIL import Image
 
 BASE_URL = "http://127.0.0.1:8000"
 
@@ -9,6 +11,13 @@ EMPLOYEE_NAME = "Test User"
 EMPLOYEE_CODE = "EMP-TEST-001"
 
 
+def fake_jpeg(color: str = "gray") -> bytes:
+    # Small real JPEG so the server-side image checks accept it
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
 def create_employee():
     resp = requests.post(
         f"{BASE_URL}/employee/create",
@@ -21,9 +30,9 @@ def create_employee():
 
 
 def start_session(employee_id: int):
-    # Simulate files with small binaries
-    selfie_bytes = b"selfie-bytes"
-    odo_bytes = b"odo-bytes"
+    # Simulate files with small generated images
+    selfie_bytes = fake_jpeg("white")
+    odo_bytes = fake_jpeg("black")
 
     data = {
         "data": json.dumps({
@@ -57,6 +66,32 @@ def update_location(session_id: int, employee_id: int, lat: float, lng: float):
     return resp.status_code, resp.json()
 
 
+def update_locations(session_id: int, points: list[tuple[float, float]]):
+    # One request for the whole buffer instead of one POST per point
+    now = time.time()
+    resp = requests.post(
+        f"{BASE_URL}/tracking/update-locations",
+        json={
+            "session_id": session_id,
+            "points": [
+                [lat, lng, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - 10 * (len(points) - i)))]
+                for i, (lat, lng) in enumerate(points)
+            ],
+        },
+        timeout=10,
+    )
+    return resp.status_code, resp.json()
+
+
+def upload_batch(bucket: str, count: int = 3):
+    files = [
+        ("files", (f"img{i}.jpg", fake_jpeg(), "image/jpeg"))
+        for i in range(count)
+    ]
+    resp = requests.post(f"{BASE_URL}/upload/{bucket}/batch", files=files, timeout=30)
+    return resp.status_code, resp.json()
+
+
 def get_polyline(session_id: int):
     resp = requests.get(f"{BASE_URL}/tracking/polyline/{session_id}", timeout=10)
     return resp.status_code, resp.json()
@@ -82,6 +117,19 @@ if __name__ == "__main__":
         print("Update:", code, body)
         time.sleep(1)
 
+    # Send a buffered batch of points in one request
+    print("Updating locations in a batch...")
+    code, body = update_locations(session_id, [
+        (12.9720, 77.5951),
+        (12.9721, 77.5952),
+        (12.9722, 77.5954),
+    ])
+    print("Batch update:", code, body)
+
+    print("Uploading a batch of images...")
+    code, body = upload_batch("selfies")
+    print("Batch upload:", code, body)
+
     print("Fetching polyline...")
     code, points = get_polyline(session_id)
     print("Polyline:", code, points)
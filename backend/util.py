@@ -1,50 +1,140 @@
+import io
+import hashlib
+import threading
 import os
+import logging
+import orjson
 import uuid
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import httpx
 from dotenv import load_dotenv
+from PIL import Image, ImageOps
+from pillow_heif import register_heif_opener
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from supabase import create_client
-from google import genai
+from sqlalchemy.pool import NullPool
+from supabase import create_client, ClientOptions
+from redis import asyncio as aioredis
 
 
 load_dotenv()
 
+# iPhone cameras default to HEIC; let Pillow decode it like any other photo
+register_heif_opener()
+
+logger = logging.getLogger(__name__)
+
 # --------------------------------------------------
-# SUPABASE CONFIG
+# SETTINGS (environment read once at import)
 # --------------------------------------------------
-SUPABASE_PROJECT_URL = os.getenv("SUPABASE_PROJECT_URL")
-SUPABASE_ANON_KEY = os.getenv("ANON_KEY")
-SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
+@dataclass(frozen=True, slots=True)
+class Settings:
+    supabase_url: str | None
+    anon_key: str | None
+    db_url: str | None
+    gemini_key: str | None
+    redis_url: str | None
 
-if not SUPABASE_PROJECT_URL:
-    raise ValueError("SUPABASE_PROJECT_URL environment variable must be set")
 
-if not SUPABASE_ANON_KEY:
-    raise ValueError("ANON_KEY environment variable must be set")
+settings = Settings(
+    supabase_url=os.getenv("SUPABASE_PROJECT_URL"),
+    anon_key=os.getenv("ANON_KEY"),
+    db_url=os.getenv("SUPABASE_DB_URL"),
+    gemini_key=os.getenv("GEMINI_API_KEY"),
+    redis_url=os.getenv("REDIS_URL"),
+)
+
+# --------------------------------------------------
+# SUPABASE CONFIG
+# --------------------------------------------------
+# Report every missing variable at once instead of one per redeploy
+_required = {
+    "SUPABASE_PROJECT_URL": settings.supabase_url,
+    "ANON_KEY": settings.anon_key,
+    "SUPABASE_DB_URL": settings.db_url,
+}
+_missing = [name for name, value in _required.items() if not value]
+if _missing:
+    raise ValueError(f"Missing environment variables: {', '.join(_missing)}")
 
-if not SUPABASE_DB_URL:
-    raise ValueError("SUPABASE_DB_URL environment variable must be set")
+# One pooled client for every Storage request so uploads reuse open TLS connections
+storage_http = httpx.Client(
+    http2=True,
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+)
 
-supabase = create_client(SUPABASE_PROJECT_URL, SUPABASE_ANON_KEY)
+try:
+    supabase = create_client(
+        settings.supabase_url, settings.anon_key,
+        options=ClientOptions(httpx_client=storage_http),
+    )
+except TypeError:
+    # Older supabase-py without httpx_client support
+    supabase = create_client(settings.supabase_url, settings.anon_key)
 
 # --------------------------------------------------
 # GEMINI CLIENT (for OCR)
 # --------------------------------------------------
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-gemini_client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
+_OCR_ENABLED = bool(settings.gemini_key)
+
+_gemini = None
+_gemini_lock = threading.Lock()
+
+def _get_gemini():
+    """Gemini client, created on the first OCR call; None when OCR isn't configured.
+
+    The SDK (and its grpc/protobuf/google-auth deps) is only imported here, so
+    processes that never OCR don't pay for it at startup.
+    """
+    global _gemini
+    if _gemini is None and settings.gemini_key:
+        with _gemini_lock:
+            if _gemini is None:
+                from google import genai
+                _gemini = genai.Client(api_key=settings.gemini_key)
+    return _gemini
+
+# --------------------------------------------------
+# REDIS (optional, polyline throttle cache)
+# --------------------------------------------------
+redis_client = aioredis.from_url(settings.redis_url, decode_responses=True) if settings.redis_url else None
 
 # --------------------------------------------------
 # DATABASE (Supabase PostgreSQL)
 # --------------------------------------------------
-# Enable pool_pre_ping to transparently recover dropped connections and pool_recycle
-# to refresh stale connections from the pool. These reduce OperationalError when the
-# DB closes idle connections (common on managed / free tiers).
-engine = create_engine(
-    SUPABASE_DB_URL,
-    pool_pre_ping=True,
-    pool_recycle=1800,  # recycle connections every 30 minutes
+# Port 6543 is Supabase's pgbouncer (transaction mode): it already pools server
+# connections, so keep no local pool and open/close through it per checkout.
+# Direct connections get a pool sized for FastAPI's threadpool; pool_pre_ping
+# recovers dropped connections and pool_recycle refreshes stale ones, which
+# reduces OperationalError when the DB closes idle connections (managed / free tiers).
+if ":6543" in settings.db_url:
+    engine = create_engine(
+        settings.db_url,
+        poolclass=NullPool,
+        query_cache_size=1200,  # compiled-statement cache (default 500)
+    )
+else:
+    engine = create_engine(
+        settings.db_url,
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=1800,  # recycle connections every 30 minutes
+        query_cache_size=1200,  # compiled-statement cache (default 500)
+    )
+# expire_on_commit=False: objects stay usable after commit without a re-SELECT
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+
+# Read-only endpoints run in AUTOCOMMIT, skipping BEGIN/ROLLBACK round trips
+ReadOnlySession = sessionmaker(
+    bind=engine.execution_options(isolation_level="AUTOCOMMIT"),
+    autoflush=False,
+    expire_on_commit=False,
 )
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 def get_db():
     db = SessionLocal()
@@ -53,39 +143,204 @@ def get_db():
     finally:
         db.close()
 
+def get_db_readonly():
+    db = ReadOnlySession()
+    try:
+        yield db
+    finally:
+        db.close()
+
 
 # --------------------------------------------------
 # GENERIC IMAGE UPLOAD FUNCTION
 # --------------------------------------------------
-def upload_to_bucket(file, bucket_name: str):
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Public object URLs are a fixed format; build them directly instead of via the SDK
+_PUBLIC_BASE = f"{settings.supabase_url}/storage/v1/object/public"
+
+ALLOWED_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Raw phone photos (3-8 MB, any format Pillow reads) are accepted up to this size
+# and downscaled to JPEG before storage; stored objects must fit MAX_UPLOAD_BYTES.
+# Selfies are stored as-is (no downscale), so they are held to MAX_UPLOAD_BYTES raw.
+MAX_RAW_IMAGE_BYTES = 25 << 20
+MAX_UPLOAD_BYTES = 5 << 20
+
+def image_format(fileobj) -> str | None:
+    """Pillow format name ("JPEG", "PNG", "HEIF", ...) from the header only, or None; rewinds the file."""
     try:
-        file_bytes = file.file.read()
-        ext = file.filename.split(".")[-1]
-        file_name = f"{uuid.uuid4()}.{ext}"
+        fileobj.seek(0)
+        with Image.open(fileobj) as img:
+            return img.format
+    except Exception:
+        return None
+    finally:
+        fileobj.seek(0)
+
+def _stored_type(fmt: str) -> tuple[str, str]:
+    """(extension, content type) for an object stored in its original format."""
+    ext = ".jpg" if fmt == "JPEG" else f".{fmt.lower()}"
+    return ext, Image.MIME.get(fmt, "application/octet-stream")
+
+def _prepare_image(data: bytes) -> bytes | None:
+    """Downscaled JPEG ready for Storage, or None if undecodable or too large."""
+    # Size is checked before decoding, so an oversized upload costs no decode
+    if len(data) > MAX_RAW_IMAGE_BYTES:
+        logger.warning("upload rejected, %d bytes in", len(data))
+        return None
+    small = downscale_image(data)
+    if small is None or len(small) > MAX_UPLOAD_BYTES:
+        logger.warning("upload rejected, %d bytes in", len(data))
+        return None
+    return small
 
-        print("Uploading to bucket:", bucket_name, "as", file_name)
+def image_ext(filename: str | None) -> str | None:
+    """Lower-cased extension of an image filename, or None if it isn't an allowed image type."""
+    # Files sent without an extension are treated as JPEG (camera default)
+    ext = os.path.splitext(filename or "")[1].lower() or ".jpg"
+    return ext if ext in ALLOWED_IMAGE_EXTS else None
 
-        supabase.storage.from_(bucket_name).upload(file_name, file_bytes)
+# Shared by the sync and async upload paths; downscaled uploads are JPEG
+_UPLOAD_HEADERS = {
+    "Authorization": f"Bearer {settings.anon_key}",
+    "apikey": settings.anon_key,
+    "Content-Type": "image/jpeg",
+}
+
+def _new_object(bucket_name: str, ext: str = ".jpg") -> tuple[str, str]:
+    """(Storage upload URL, public URL) for a fresh object name in bucket_name."""
+    file_name = f"{uuid.uuid4().hex}{ext}"
+    logger.debug("upload bucket=%s name=%s", bucket_name, file_name)
+    return (
+        f"{settings.supabase_url}/storage/v1/object/{bucket_name}/{file_name}",
+        f"{_PUBLIC_BASE}/{bucket_name}/{file_name}",
+    )
+
+def _iter_chunks(fileobj):
+    while chunk := fileobj.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+def _store_object(bucket_name: str, content, ext: str = ".jpg", content_type: str = "image/jpeg"):
+    # content is bytes or an iterator of chunks (sent chunked, never held whole)
+    try:
+        upload_url, public_url = _new_object(bucket_name, ext)
 
-        public_url = supabase.storage.from_(bucket_name).get_public_url(file_name)
+        headers = {**_UPLOAD_HEADERS, "Content-Type": content_type}
+        resp = storage_http.post(upload_url, content=content, headers=headers)
+        resp.raise_for_status()
 
-        print("Uploaded URL:", public_url)
+        logger.debug("uploaded url=%s", public_url)
 
         return public_url
 
-    except Exception as e:
-        print("Upload error:", e)
+    except Exception:
+        logger.exception("upload failed")
+        return None
+
+# --------------------------------------------------
+# BATCH UPLOADS (async, bounded fan-out)
+# --------------------------------------------------
+# Async twin of storage_http; over HTTP/2 a batch shares one multiplexed connection
+storage_http_async = httpx.AsyncClient(
+    http2=True,
+    timeout=60,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+)
+
+MAX_UPLOAD_BATCH = 20
+
+async def _upload_one(file, bucket_name: str) -> str | None:
+    if file.size is not None and file.size > MAX_RAW_IMAGE_BYTES:
+        logger.warning("upload rejected, %d bytes", file.size)
+        return None
+    data = await asyncio.to_thread(_prepare_image, await file.read())
+    if data is None:
+        return None
+
+    upload_url, public_url = _new_object(bucket_name)
+    try:
+        resp = await storage_http_async.post(upload_url, content=data, headers=_UPLOAD_HEADERS)
+        resp.raise_for_status()
+    except Exception:
+        logger.exception("upload failed")
+        return None
+    logger.debug("uploaded url=%s", public_url)
+    return public_url
+
+async def upload_many(files, bucket_name: str, concurrency: int = 8) -> list[str | None]:
+    """Upload several UploadFiles with at most `concurrency` in flight.
+
+    Returns public URLs in input order, None for any file that failed.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(file):
+        async with sem:
+            return await _upload_one(file, bucket_name)
+
+    return await asyncio.gather(*(one(f) for f in files))
+
+
+async def upload_to_bucket(file, bucket_name: str):
+    """Stream an UploadFile to Storage as-is in UPLOAD_CHUNK_SIZE chunks.
+
+    Rewinds first, so a file that was already read (e.g. sent to face
+    verification) is uploaded whole. Extension and content type come from the
+    image header, not the client's filename. The header sniff and the blocking
+    POST run in a worker thread so the event loop keeps serving requests.
+    """
+    # Stored without downscaling, so the raw file must already fit
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        logger.warning("upload rejected, %d bytes", file.size)
         return None
+    fmt = await asyncio.to_thread(image_format, file.file)
+    if fmt is None:
+        logger.warning("upload rejected, not an image")
+        return None
+    ext, content_type = _stored_type(fmt)
+    return await asyncio.to_thread(_store_object, bucket_name, _iter_chunks(file.file), ext, content_type)
+
+def upload_bytes_to_bucket(data: bytes, bucket_name: str):
+    data = _prepare_image(data)
+    if data is None:
+        return None
+    return _store_object(bucket_name, data)
 
 
 # --------------------------------------------------
-# SPECIALIZED IMAGE UPLOADS
+# DIRECT CLIENT UPLOADS (signed upload URL)
 # --------------------------------------------------
-def upload_selfie(file):
-    return upload_to_bucket(file, "selfies")
+UPLOAD_BUCKETS = ("selfies", "odometers")
+
+def create_upload_ticket(filename: str, bucket_name: str) -> dict | None:
+    """Signed URL the client PUTs the file to directly; the bytes never pass through the backend."""
+    ext = image_ext(filename)
+    if ext is None:
+        return None
+
+    try:
+        file_name = f"{uuid.uuid4().hex}{ext}"
+
+        signed = supabase.storage.from_(bucket_name).create_signed_upload_url(file_name)
+
+        return {
+            "upload_url": signed.get("signed_url") or signed.get("signedUrl"),
+            "token": signed.get("token"),
+            "file_name": file_name,
+            "public_url": f"{_PUBLIC_BASE}/{bucket_name}/{file_name}",
+        }
+
+    except Exception:
+        logger.exception("upload ticket failed")
+        return None
 
-def upload_odometer(file):
-    return upload_to_bucket(file, "odometers")
+
+# --------------------------------------------------
+# SPECIALIZED IMAGE UPLOADS
+# --------------------------------------------------
+def upload_odometer_bytes(data: bytes):
+    return upload_bytes_to_bucket(data, "odometers")
 
 
 
@@ -93,44 +348,307 @@ def upload_odometer(file):
 # --------------------------------------------------
 # ODOMETER OCR EXTRACTION (Gemini)
 # --------------------------------------------------
-def extract_odometer_mileage(file) -> float:
-    """Extract the odometer mileage from an uploaded file using Gemini OCR.
+# Dedicated pool so multi-second Gemini calls don't occupy the request threadpool
+OCR_EXEC = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ocr")
+
+# Photos are downscaled to fit this box before OCR/storage; odometer digits stay legible
+OCR_MAX_SIDE = 1024
+
+EXIF_ORIENTATION = 0x0112
+
+def downscale_image(data: bytes) -> bytes | None:
+    """Re-encode an image as upright JPEG q85 fitting OCR_MAX_SIDE.
+
+    An already small, upright JPEG is returned unchanged; None if it can't be decoded.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        if (img.format == "JPEG" and max(img.size) <= OCR_MAX_SIDE
+                and img.getexif().get(EXIF_ORIENTATION, 1) == 1):
+            return data
+        # Re-encoding drops EXIF, so bake the orientation into the pixels first
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=85, optimize=True)
+        return buf.getvalue()
+    except Exception:
+        logger.warning("could not decode image for downscaling")
+        return None
+
+# Gemini returns {"mileage": <number>} directly, no free-text parsing needed
+OCR_MODEL = "gemini-2.0-flash-lite"
+_OCR_PROMPT = "Identify the odometer reading in this image and return the total mileage."
+# Plain dicts: the SDK accepts them for config/parts, so no genai import is needed here
+_MILEAGE_SCHEMA = {
+    "type": "object",
+    "properties": {"mileage": {"type": "number"}},
+    "required": ["mileage"],
+}
+_OCR_CONFIG = {"response_mime_type": "application/json", "response_schema": _MILEAGE_SCHEMA}
+
+def _jpeg_part(data: bytes) -> dict:
+    return {"inline_data": {"data": data, "mime_type": "image/jpeg"}}
+
+# Retried / duplicate photos reuse the earlier reading instead of another Gemini call
+OCR_CACHE_SIZE = 1024
+_ocr_cache: OrderedDict[bytes, float] = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+
+def _ocr_key(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _ocr_cache_get(key: bytes) -> float | None:
+    with _ocr_cache_lock:
+        if key in _ocr_cache:
+            _ocr_cache.move_to_end(key)
+            return _ocr_cache[key]
+    return None
+
+def _ocr_cache_put(key: bytes, mileage: float) -> None:
+    with _ocr_cache_lock:
+        _ocr_cache[key] = mileage
+        if len(_ocr_cache) > OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
+
+def extract_odometer_mileage_bytes(file_bytes: bytes) -> float:
+    """Extract the odometer mileage from image bytes using Gemini OCR.
 
     Returns a float mileage if parsed; otherwise returns 0.0.
     """
-    if not gemini_client:
+    if not _OCR_ENABLED:
+        return 0.0
+
+    key = _ocr_key(file_bytes)
+    cached = _ocr_cache_get(key)
+    if cached is not None:
+        return cached
+
+    client = _get_gemini()
+    if client is None:
         return 0.0
 
     try:
-        # Read file bytes from UploadFile-like object
-        file_bytes = file.file.read() if hasattr(file, "file") else file.read()
-        # Construct an image payload compatible with Gemini client
-        # The genai client in ocr_test accepts PIL Image directly; for API simplicity here
-        # we pass raw bytes with a generic prompt.
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[
-                (
-                    "Identify the odometer reading in this image and return only a JSON like {\"mileage\": 12345}."
-                ),
-                file_bytes,
-            ],
+        # Callers pass downscale_image output, which is JPEG
+        response = client.models.generate_content(
+            model=OCR_MODEL,
+            contents=[_OCR_PROMPT, _jpeg_part(file_bytes)],
+            config=_OCR_CONFIG,
         )
-        text = getattr(response, "text", "")
-        # Attempt to parse a number from the response text
-        import re, json
-        mileage = 0.0
-        # Try JSON parsing first
+        mileage = float(orjson.loads(response.text)["mileage"])
+    except Exception:
+        # Failures aren't cached so a retry gets a fresh attempt
+        return 0.0
+
+    _ocr_cache_put(key, mileage)
+    return mileage
+
+
+# --------------------------------------------------
+# OCR MICRO-BATCHING
+# --------------------------------------------------
+# Requests arriving within the window share one Gemini call (up to OCR_BATCH_MAX images)
+OCR_BATCH_MAX = 8
+OCR_BATCH_WINDOW_MS = 50
+# Upper bound a request waits for its reading (batch call plus per-image fallback)
+OCR_SUBMIT_TIMEOUT_S = 45.0
+
+_OCR_BATCH_PROMPT = (
+    "Each image shows an odometer and is preceded by its index. Return one entry per "
+    "image with that index and the image's total mileage."
+)
+# Results are matched back to requests by index, never by array position
+_OCR_BATCH_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {"index": {"type": "integer"}, "mileage": {"type": "number"}},
+            "required": ["index", "mileage"],
+        },
+    },
+}
+
+
+class OCRBatcher:
+    """Coalesces concurrent odometer OCR requests into multi-image Gemini calls.
+
+    The collector task is started on the first submit() so it binds to the
+    running event loop.
+    """
+
+    def __init__(self, max_batch: int = OCR_BATCH_MAX, window_ms: int = OCR_BATCH_WINDOW_MS):
+        self.max_batch = max_batch
+        self.window_s = window_ms / 1000.0
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+
+    async def submit(self, data: bytes) -> float:
+        """Mileage for JPEG bytes (downscale_image output); 0.0 on failure."""
+        if not _OCR_ENABLED:
+            return 0.0
+
+        key = _ocr_key(data)
+        cached = _ocr_cache_get(key)
+        if cached is not None:
+            return cached
+
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._collect())
+
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, data, fut))
         try:
-            data = json.loads(text)
-            val = data.get("mileage")
-            if isinstance(val, (int, float)):
-                mileage = float(val)
+            return await asyncio.wait_for(fut, OCR_SUBMIT_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            logger.warning("OCR timed out after %.0f s", OCR_SUBMIT_TIMEOUT_S)
+            return 0.0
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window_s
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Send without blocking collection of the next batch
+            task = asyncio.create_task(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch):
+        loop = asyncio.get_running_loop()
+        results = None
+        try:
+            if not _OCR_ENABLED:
+                return
+            if len(batch) > 1:
+                # SDK import + client construction stay off the event loop
+                client = await asyncio.to_thread(_get_gemini)
+                if client is not None:
+                    try:
+                        results = await self._send_batch(client, batch)
+                    except Exception:
+                        # Fall back to one call per image rather than failing the whole batch
+                        logger.exception("batched OCR failed, retrying %d images individually", len(batch))
+            if results is None:
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(OCR_EXEC, extract_odometer_mileage_bytes, data)
+                    for _, data, _ in batch
+                ))
         except Exception:
-            # Fallback: find first integer/float in text
-            match = re.search(r"\b(\d{1,8}(?:\.\d{1,2})?)\b", text)
-            if match:
-                mileage = float(match.group(1))
-        return mileage
+            # e.g. OCR_EXEC already shut down; callers get 0.0 below instead of hanging
+            logger.exception("OCR failed for %d images", len(batch))
+        finally:
+            for i, (_, _, fut) in enumerate(batch):
+                if not fut.done():
+                    fut.set_result(results[i] if results is not None else 0.0)
+
+    @staticmethod
+    async def _send_batch(client, batch) -> list[float]:
+        contents = [_OCR_BATCH_PROMPT]
+        for i, (_, data, _) in enumerate(batch):
+            contents += [f"Image {i}:", _jpeg_part(data)]
+        response = await client.aio.models.generate_content(
+            model=OCR_MODEL,
+            contents=contents,
+            config=_OCR_BATCH_CONFIG,
+        )
+        items = orjson.loads(response.text)
+        by_index = {int(item["index"]): float(item["mileage"]) for item in items}
+        # Exactly one reading per image, or a misattributed mileage could slip through
+        if len(items) != len(batch) or sorted(by_index) != list(range(len(batch))):
+            raise ValueError(f"expected indexes 0..{len(batch) - 1}, got {sorted(by_index)}")
+        results = [by_index[i] for i in range(len(batch))]
+        for (key, _, _), mileage in zip(batch, results):
+            _ocr_cache_put(key, mileage)
+        return results
+
+
+ocr_batcher = OCRBatcher()
+
+
+# --------------------------------------------------
+# ODOMETER: ONE READ, UPLOAD + OCR IN PARALLEL
+# --------------------------------------------------
+async def process_odometer(file) -> tuple[str | None, float]:
+    """Read an odometer UploadFile once, downscale it, then upload it and OCR it concurrently.
+
+    The downscaled JPEG is what gets stored, so the bucket holds the same bytes
+    Gemini read. Returns (public_url, mileage); failures come back as None / 0.0
+    like the individual helpers.
+    """
+    if file.size is not None and file.size > MAX_RAW_IMAGE_BYTES:
+        logger.warning("odometer image rejected, %d bytes", file.size)
+        return None, 0.0
+    raw = await file.read()
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(OCR_EXEC, downscale_image, raw)
+    if data is None:
+        return None, 0.0
+
+    url, mileage = await asyncio.gather(
+        asyncio.to_thread(upload_odometer_bytes, data),
+        ocr_batcher.submit(data),
+        return_exceptions=True,
+    )
+    if isinstance(url, Exception):
+        url = None
+    if isinstance(mileage, Exception):
+        mileage = 0.0
+    return url, mileage
+
+
+# --------------------------------------------------
+# ODOMETER OCR FOR A CLIENT-UPLOADED IMAGE (by URL)
+# --------------------------------------------------
+async def _fetch_limited(url: str, limit: int) -> bytes | None:
+    """GET url, streaming; None on error or once the body exceeds limit bytes."""
+    try:
+        async with storage_http_async.stream("GET", url, timeout=30) as resp:
+            resp.raise_for_status()
+            if int(resp.headers.get("content-length") or 0) > limit:
+                logger.warning("odometer image too large: %s", resp.headers["content-length"])
+                return None
+            buf = bytearray()
+            async for chunk in resp.aiter_bytes():
+                buf += chunk
+                if len(buf) > limit:
+                    logger.warning("odometer image exceeded %d bytes", limit)
+                    return None
+            return bytes(buf)
     except Exception:
-        return 0.0
\ No newline at end of file
+        logger.exception("odometer image fetch failed")
+        return None
+
+
+async def extract_odometer_mileage_url(url: str) -> float:
+    """Odometer mileage for an image the client already uploaded to storage; 0.0 on failure.
+
+    Goes through ocr_batcher like process_odometer, so it shares the cache and batching.
+    """
+    if not _OCR_ENABLED:
+        return 0.0
+
+    # Only fetch from our own odometer bucket, never an arbitrary URL
+    if not url.startswith(f"{_PUBLIC_BASE}/odometers/"):
+        return 0.0
+
+    # Client-uploaded files are raw phone photos, so the pre-downscale limit applies
+    raw = await _fetch_limited(url, MAX_RAW_IMAGE_BYTES)
+    if raw is None:
+        return 0.0
+    data = await asyncio.get_running_loop().run_in_executor(OCR_EXEC, downscale_image, raw)
+    if data is None:
+        return 0.0
+    return await ocr_batcher.submit(data)
@@ -88,7 +88,7 @@ export default function UserTracking() {
                   'Content-Type': 'application/json',
                 }
               });
-              setStatus(`Tracking... (${response.data.polyline_logged ? "logged" : "checking"})`);
+              setStatus(`Tracking... (${response.data.polyline_queued ? "queued" : "checking"})`);
             } catch (e) {
               console.error("Location update failed:", e);
               console.error("Error response:", e.response?.data);